@@ -0,0 +1,216 @@
+from benchmark.synthetic import generate_records, generate_school, generate_teachers
+from benchmark.parse import measure
+from colleges.temple_session import TUSession
+from ratemyprofessor.database import Teacher
+from ratemyprofessor.index import TeacherIndex
+from school.catalog import CatalogSnapshot
+from school.course_builder import CourseBuilder, CourseSelect
+from school.courses import CourseSection, Teacher_Indexes, parse_sections
+from school.schedule import SchedulePlot, ScheduleCompare
+from school.schedule_metrics import MetricsAccumulator
+from school.section_table import SectionTable
+from school.week_schedule import WeekSchedule
+from util.instrument import Instrumentation
+from typing import Dict, List, Optional, Tuple
+from pydantic import Json
+import matplotlib
+import matplotlib.pyplot as plt
+import subprocess
+import argparse
+import platform
+import logging
+import json
+import time
+import sys
+
+Term = 202503
+
+
+def score(_schedules: List[SchedulePlot]) -> list:
+    return [
+        (
+            ScheduleCompare.week_range(schedule),
+            ScheduleCompare.week_total(schedule),
+            ScheduleCompare.between_total(schedule),
+            ScheduleCompare.teacher_rating(schedule),
+        )
+        for schedule in _schedules
+    ]
+
+
+def run_size(
+    *,
+    courses: int,
+    select: int,
+    sections_per_course: int,
+    meetings_per_section: int,
+    conflict_rate: float,
+    online_rate: float,
+    max_schedules: int,
+    render: int,
+    repeat: int,
+) -> Json:
+    """Measure every stage of planning on one synthetic term, returning the best time of each in seconds."""
+    Instrumentation.reset()
+    records = generate_records(
+        courses=courses,
+        sections_per_course=sections_per_course,
+        term=str(Term),
+        meetings_per_section=meetings_per_section,
+        conflict_rate=conflict_rate,
+        online_rate=online_rate,
+    )
+    raw = json.dumps(records).encode()
+    sections = parse_sections(raw)
+
+    # Serve everything locally: sections from a snapshot and ratings from a teacher index
+    session = TUSession()
+    session.use_snapshot(CatalogSnapshot(Term, records, sections=sections))
+    teachers = generate_teachers(records, generate_school(school_id=session.id))
+    Teacher_Indexes[session.id] = TeacherIndex([Teacher(**teacher) for teacher in teachers])
+
+    builder = CourseBuilder(session)
+    builder.select_term(Term)
+    course_names = list(dict.fromkeys(section.subjectCourse for section in sections))
+    builder.select([CourseSelect(course=course) for course in course_names[:select]])
+
+    table, candidates = builder._get_table()
+    combinations = list(builder._search(table, candidates))
+    # Scoring while searching reads the rating of every candidate
+    table.load_ratings(session.id, rows=sorted({row for units in candidates for unit in units for row in unit}))
+
+    table_schedules = [
+        SchedulePlot(table.get_sections(rows), school_id=session.id, table=table, rows=rows)
+        for rows in combinations[:max_schedules]
+    ]
+    schedule_sections = [table.get_sections(rows) for rows in combinations[:max_schedules]]
+    week_schedules = [section.get_schedule() for section in sections[:200]]
+
+    stages = {
+        "parse": measure(lambda: parse_sections(raw), repeat=repeat),
+        "ignore_filter": measure(lambda: [s for s in sections if builder._section_ignore_filter(s)], repeat=repeat),
+        "build_table": measure(lambda: builder._get_table(), repeat=repeat),
+        "search": measure(lambda: list(builder._search(table, candidates)), repeat=repeat),
+        "combinations": measure(lambda: list(builder._get_combinations()), repeat=repeat),
+        "score_table": measure(lambda: score(table_schedules), repeat=repeat),
+        # Search that also accumulates the scores of every combination it finds
+        "search_metrics": measure(lambda: search_metrics(table, candidates), repeat=repeat),
+        # Scoring from the full sections, which builds their weekly schedules first
+        "score_models": measure(
+            lambda: score([SchedulePlot(courses, school_id=session.id) for courses in schedule_sections]), repeat=repeat
+        ),
+        "week_schedule_build": measure(lambda: [section.get_schedule() for section in sections], repeat=repeat),
+        "week_schedule_overlaps": measure(
+            lambda: [a.overlaps(b) for a in week_schedules for b in week_schedules], repeat=repeat
+        ),
+        "week_schedule_merge": measure(lambda: merge_schedules(schedule_sections), repeat=repeat),
+    }
+
+    # Rendering depends on fonts and the matplotlib version, so failures are recorded instead of stopping the run
+    errors = {}
+    if render and table_schedules:
+        try:
+            rendered = table_schedules[:render]
+            stages["render"] = measure(lambda: render_schedules(rendered), repeat=1) / len(rendered)
+        except Exception as error:
+            errors["render"] = f"{type(error).__name__}: {error}"
+
+    return {
+        "sections_per_course": sections_per_course,
+        "sections": len(sections),
+        "selected_sections": len(table),
+        "combinations": len(combinations),
+        "scored_schedules": len(table_schedules),
+        "stages": stages,
+        "errors": errors,
+        **({"instrumentation": Instrumentation.summary()} if Instrumentation.enabled else {}),
+    }
+
+
+def search_metrics(_table: SectionTable, _candidates: List[List[Tuple[int, ...]]]) -> list:
+    accumulator = MetricsAccumulator(_table)
+    return [
+        (rows, accumulator.metrics()) for rows in CourseBuilder._search(_table, _candidates, accumulator=accumulator)
+    ]
+
+
+def merge_schedules(_schedule_sections: List[List[CourseSection]]) -> List[WeekSchedule]:
+    """Merge the weekly ranges of every section of each schedule into a single week."""
+    merged = []
+    for sections in _schedule_sections:
+        week = WeekSchedule()
+        for section in sections:
+            for time_range in section.get_schedule():
+                week += time_range
+        merged.append(week)
+    return merged
+
+
+def render_schedules(_schedules: List[SchedulePlot]):
+    for schedule in _schedules:
+        schedule.plot()
+        plt.close("all")
+
+
+def git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(["git", "rev-parse", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run(*, sizes: List[int], **kwargs) -> Json:
+    results = []
+    for size in sizes:
+        print(f"sections per course: {size}", file=sys.stderr)
+        results.append(run_size(sections_per_course=size, **kwargs))
+
+    return {
+        "created": time.time(),
+        "commit": git_commit(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "config": {"sizes": sizes, **kwargs},
+        "results": results,
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Measure each planning stage on synthetic terms of growing size.")
+    parser.add_argument("--sizes", type=lambda value: [int(size) for size in value.split(",")], default=[4, 8, 12])
+    parser.add_argument("--courses", type=int, default=100, help="courses in the synthetic term")
+    parser.add_argument("--select", type=int, default=5, help="courses selected for the schedule")
+    parser.add_argument("--meetings", type=int, default=1, help="meeting blocks per section")
+    parser.add_argument("--conflict-rate", type=float, default=0.2)
+    parser.add_argument("--online-rate", type=float, default=0.1)
+    parser.add_argument("--max-schedules", type=int, default=2000, help="schedules scored per size")
+    parser.add_argument("--render", type=int, default=1, help="schedules rendered per size (0 to skip)")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--instrument", action="store_true", help="record pipeline spans and counters per size")
+    parser.add_argument("--output", help="file the JSON results are written to instead of stdout")
+    arguments = parser.parse_args()
+
+    # Render off screen without warnings about missing fonts
+    matplotlib.use("Agg")
+    logging.getLogger("matplotlib.font_manager").setLevel(logging.ERROR)
+
+    if arguments.instrument:
+        Instrumentation.enable()
+
+    options: Dict[str, object] = {
+        "courses": arguments.courses,
+        "select": arguments.select,
+        "meetings_per_section": arguments.meetings,
+        "conflict_rate": arguments.conflict_rate,
+        "online_rate": arguments.online_rate,
+        "max_schedules": arguments.max_schedules,
+        "render": arguments.render,
+        "repeat": arguments.repeat,
+    }
+    results = json.dumps(run(sizes=arguments.sizes, **options), indent=4)
+
+    if arguments.output:
+        with open(arguments.output, "w") as file:
+            file.write(results + "\n")
+    else:
+        print(results)
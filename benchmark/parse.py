@@ -0,0 +1,33 @@
+from benchmark.synthetic import generate_records
+from school.courses import CourseSection, parse_sections
+from typing import Callable, Dict
+import argparse
+import timeit
+import json
+
+
+def measure(_function: Callable[[], object], *, repeat: int) -> float:
+    """Return the best time of `repeat` runs in seconds."""
+    return min(timeit.repeat(_function, number=1, repeat=repeat))
+
+
+def run(*, sections: int, repeat: int) -> Dict[str, float]:
+    records = generate_records(courses=max(1, sections // 10), sections_per_course=10)
+    raw = json.dumps(records).encode()
+
+    return {
+        "sections": len(records),
+        # Current path: decode the response, then validate every record on its own
+        "per_record": measure(lambda: [CourseSection(**record) for record in json.loads(raw)], repeat=repeat),
+        "adapter_python": measure(lambda: parse_sections(json.loads(raw)), repeat=repeat),
+        "adapter_json": measure(lambda: parse_sections(raw), repeat=repeat),
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare the ways of parsing Banner search records.")
+    parser.add_argument("--sections", type=int, default=5000)
+    parser.add_argument("--repeat", type=int, default=5)
+    arguments = parser.parse_args()
+
+    print(json.dumps(run(sections=arguments.sections, repeat=arguments.repeat), indent=4))
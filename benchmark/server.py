@@ -0,0 +1,349 @@
+from benchmark.synthetic import generate_records, generate_school, generate_teachers
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from ratemyprofessor.database import b64decode, b64encode
+from ratemyprofessor.index import name_tokens
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import parse_qs, urlsplit
+from pydantic import Json
+import itertools
+import threading
+import argparse
+import random
+import json
+import gzip
+import time
+
+
+class FakeServer:
+    """
+    Local stand-in for Temple's self service banner and the RateMyProfessor GraphQL API.
+
+    Search, linked section, term, campus and plan endpoints are answered from section records, and teacher and
+    school queries from teacher records, either recorded (see `from_files`) or synthetic. Every response can be
+    delayed and a fraction of them replaced by errors to exercise retries. Point sessions at it with
+    `TUSession(base_url=server.banner_url)` and `RateMyProfessor(url=server.graphql_url)`.
+    """
+
+    BannerPath = "/StudentRegistrationSsb/ssb"
+    GraphQLPath = "/graphql"
+
+    records: List[Json]
+    teachers: List[Json]
+    schools: List[Json]
+    terms: List[Json]
+    latency: float
+    jitter: float
+    error_rate: float
+    error_status: int
+    max_page_size: int
+    requests: Dict[str, int]
+    _rng: random.Random
+    _lock: threading.Lock
+    _server: Optional[ThreadingHTTPServer]
+    _thread: Optional[threading.Thread]
+
+    def __init__(
+        self,
+        *,
+        records: Optional[List[Json]] = None,
+        teachers: Optional[List[Json]] = None,
+        latency: float = 0.0,
+        jitter: float = 0.0,
+        error_rate: float = 0.0,
+        error_status: int = 503,
+        max_page_size: int = 500,
+        seed: int = 2025,
+    ):
+        """
+        Args:
+            records: Banner section records, synthetic ones by default.
+            teachers: RateMyProfessor teacher records, generated for the instructors of the records by default.
+            latency: Seconds every response is delayed by.
+            jitter: Maximum random seconds added to the latency.
+            error_rate: Fraction of requests answered with `error_status` instead.
+            error_status: Status code of injected errors.
+            max_page_size: Largest search page returned, whatever size is requested (Banner caps it at 500).
+            seed: Seed of the latency jitter and error injection.
+        """
+        assert latency >= 0 and jitter >= 0, "latency must not be negative"
+        assert 0 <= error_rate <= 1, "error rate must be in the range 0 - 1"
+        assert max_page_size > 0, "max page size must be greater than zero"
+
+        self.records = records if records is not None else generate_records(courses=200, sections_per_course=8)
+        self.teachers = teachers if teachers is not None else generate_teachers(self.records, generate_school())
+        self.schools = list({teacher["school"]["id"]: teacher["school"] for teacher in self.teachers}.values())
+        self.terms = [
+            {"code": term, "description": description}
+            for term, description in {record["term"]: record["termDesc"] for record in self.records}.items()
+        ]
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.error_status = error_status
+        self.max_page_size = max_page_size
+        self.requests = {}
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self._server = None
+        self._thread = None
+
+    @classmethod
+    def from_files(cls, _catalog_path: str, _teachers_path: Optional[str] = None, **kwargs) -> "FakeServer":
+        """
+        Replay recorded data.
+
+        Args:
+            _catalog_path: Catalog snapshot saved by `SchoolSession.snapshot`.
+            _teachers_path: Teacher index saved by `load_teacher_index`, synthetic teachers are used otherwise.
+            **kwargs: Passed to the constructor.
+        """
+        with gzip.open(_catalog_path, "rt") as file:
+            records = json.load(file)["data"]
+
+        teachers = None
+        if _teachers_path is not None:
+            with gzip.open(_teachers_path, "rt") as file:
+                data = json.load(file)
+            teachers = [{**teacher, "school": data["school"]} for teacher in data["teachers"]]
+
+        return cls(records=records, teachers=teachers, **kwargs)
+
+    @property
+    def url(self) -> str:
+        assert self._server is not None, "server is not running"
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    @property
+    def banner_url(self) -> str:
+        return self.url + self.BannerPath
+
+    @property
+    def graphql_url(self) -> str:
+        return self.url + self.GraphQLPath
+
+    def start(self, *, host: str = "127.0.0.1", port: int = 0) -> "FakeServer":
+        """Serve on a background thread, on a free port unless one is given."""
+        assert self._server is None, "server is already running"
+
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                server._handle(self)
+
+            def do_POST(self):
+                server._handle(self)
+
+            def log_message(self, *args):
+                pass
+
+        self._server = ThreadingHTTPServer((host, port), Handler)
+        self._server.daemon_threads = True
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+            self._thread = None
+
+    def __enter__(self) -> "FakeServer":
+        return self.start() if self._server is None else self
+
+    def __exit__(self, *args):
+        self.stop()
+
+    def _handle(self, _request: BaseHTTPRequestHandler):
+        url = urlsplit(_request.path)
+        query = {key: values[-1] for key, values in parse_qs(url.query, keep_blank_values=True).items()}
+        body = _request.rfile.read(int(_request.headers.get("Content-Length") or 0))
+
+        with self._lock:
+            self.requests[url.path] = self.requests.get(url.path, 0) + 1
+            delay = self.latency + self._rng.uniform(0, self.jitter)
+            failed = self._rng.random() < self.error_rate
+
+        time.sleep(delay)
+
+        if failed:
+            status, result = self.error_status, {"error": "injected failure"}
+        else:
+            status, result = self._route(_request.command, url.path, query, body)
+
+        data = json.dumps(result).encode()
+        _request.send_response(status)
+        _request.send_header("Content-Type", "application/json")
+        _request.send_header("Content-Length", str(len(data)))
+        _request.end_headers()
+        _request.wfile.write(data)
+
+    def _route(self, _method: str, _path: str, _query: Dict[str, str], _body: bytes) -> Tuple[int, Json]:
+        if _path == self.GraphQLPath and _method == "POST":
+            return 200, self._graphql(json.loads(_body))
+
+        routes = {
+            "/plan/getTerms": lambda: self.terms[int(_query.get("offset", 0)) :][: int(_query.get("max", 10))],
+            "/searchResults/searchResults": lambda: self._search(_query),
+            "/searchResults/fetchLinkedSections": lambda: self._linked_sections(_query),
+            "/classSearch/get_campus": self._campuses,
+            "/term/search": lambda: {"fwdURL": f"{self.BannerPath}/classSearch/classSearch"},
+            "/courseSearch/resetDataForm": lambda: True,
+        }
+
+        path = _path[len(self.BannerPath) :] if _path.startswith(self.BannerPath) else None
+        if path not in routes:
+            return 404, {"error": f"unknown path {_path}"}
+        return 200, routes[path]()
+
+    def _campuses(self) -> List[Json]:
+        campuses = {
+            meeting["meetingTime"]["campusDescription"]: meeting["meetingTime"]["campus"]
+            for record in self.records
+            for meeting in record["meetingsFaculty"]
+        }
+        return [{"code": code, "description": description} for description, code in campuses.items()]
+
+    def _search(self, _query: Dict[str, str]) -> Json:
+        campus_codes = {campus["code"]: campus["description"] for campus in self._campuses()}
+        course = _query.get("txt_subjectcoursecombo")
+        subject = _query.get("txt_subject")
+        campus = campus_codes.get(_query.get("txt_campus", ""))
+        method = _query.get("txt_instructionalMethod")
+        open_only = _query.get("chk_open_only") == "true"
+
+        records = [
+            record
+            for record in self.records
+            if str(record["term"]) == _query.get("txt_term", str(record["term"]))
+            and (not course or record["subjectCourse"] in course.split(","))
+            and (not subject or record["subject"] == subject)
+            and (campus is None or record["campusDescription"] == campus)
+            and (not method or record["instructionalMethod"] == method)
+            and (not open_only or record["seatsAvailable"] > 0)
+        ]
+
+        offset = int(_query.get("pageOffset", 0))
+        size = min(int(_query.get("pageMaxSize", 10)), self.max_page_size)
+        page = records[offset : offset + size]
+
+        return {
+            "success": True,
+            "totalCount": len(records),
+            "data": page,
+            "pageOffset": offset,
+            "pageMaxSize": size,
+            "sectionsFetchedCount": len(records),
+        }
+
+    def _linked_sections(self, _query: Dict[str, str]) -> Json:
+        # Linked sections of a course are paired with one section of every other schedule type sharing their
+        # link identifier
+        section = next(
+            (
+                record
+                for record in self.records
+                if record["courseReferenceNumber"] == _query.get("courseReferenceNumber")
+                and str(record["term"]) == _query.get("term", str(record["term"]))
+            ),
+            None,
+        )
+        if section is None or not section["isSectionLinked"]:
+            return {"linkedData": []}
+
+        by_type: Dict[str, List[Json]] = {}
+        for record in self.records:
+            if (
+                record["isSectionLinked"]
+                and record["term"] == section["term"]
+                and record["subjectCourse"] == section["subjectCourse"]
+                and record["linkIdentifier"] == section["linkIdentifier"]
+                and record["scheduleTypeDescription"] != section["scheduleTypeDescription"]
+            ):
+                by_type.setdefault(record["scheduleTypeDescription"], []).append(record)
+
+        return {"linkedData": [list(group) for group in itertools.product(*by_type.values())] if by_type else []}
+
+    def _graphql(self, _request: Json) -> Json:
+        variables = _request.get("variables", {})
+        operation = _request.get("operationName")
+
+        if operation == "TeacherSearchPaginationQuery":
+            return {
+                "data": {"search": {"teachers": self._connection(self._find_teachers(variables["query"]), variables)}}
+            }
+        if operation == "TeacherSearchBatchQuery":
+            searches = {name: query for name, query in variables.items() if name.startswith("q")}
+            return {
+                "data": {
+                    f"t{name[1:]}": {"teachers": self._connection(self._find_teachers(query), variables)}
+                    for name, query in searches.items()
+                }
+            }
+        if operation == "SchoolSearchPaginationQuery":
+            tokens = name_tokens(variables["query"].get("text", ""))
+            schools = [school for school in self.schools if set(tokens) <= set(name_tokens(school["name"]))]
+            return {"data": {"search": {"schools": self._connection(schools, variables)}}}
+        if operation in ("SchoolQuery", "TeacherQuery"):
+            nodes = self.schools if operation == "SchoolQuery" else self.teachers
+            return {"data": {"node": next((node for node in nodes if node["id"] == variables["id"]), None)}}
+        return {"errors": [{"message": f"unknown operation {operation}"}]}
+
+    def _find_teachers(self, _query: Json) -> List[Json]:
+        tokens = set(name_tokens(_query.get("text", "")))
+        return [
+            teacher
+            for teacher in self.teachers
+            if teacher["school"]["id"] == _query.get("schoolID", teacher["school"]["id"])
+            and tokens <= set(name_tokens(f"{teacher['firstName']} {teacher['lastName']}"))
+        ]
+
+    @staticmethod
+    def _connection(_nodes: List[Json], _variables: Json) -> Json:
+        """Page nodes the way the GraphQL API does, with cursors of the form `arrayconnection:<index>`."""
+        cursor = _variables.get("cursor")
+        start = int(b64decode(cursor).rpartition(":")[2]) + 1 if cursor else 0
+        count = _variables.get("count", 10)
+        page = _nodes[start : start + count]
+
+        return {
+            "didFallback": False,
+            "edges": [
+                {"cursor": b64encode(f"arrayconnection:{start + index}"), "node": node}
+                for index, node in enumerate(page)
+            ],
+            "pageInfo": {
+                "hasNextPage": start + count < len(_nodes),
+                "endCursor": b64encode(f"arrayconnection:{start + len(page) - 1}"),
+            },
+            "resultCount": len(_nodes),
+        }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Serve Banner and RateMyProfessor data locally.")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--catalog", help="catalog snapshot to replay instead of synthetic sections")
+    parser.add_argument("--teachers", help="teacher index to replay instead of synthetic teachers")
+    parser.add_argument("--latency", type=float, default=0.0)
+    parser.add_argument("--jitter", type=float, default=0.0)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    arguments = parser.parse_args()
+
+    options = {"latency": arguments.latency, "jitter": arguments.jitter, "error_rate": arguments.error_rate}
+    server = (
+        FakeServer.from_files(arguments.catalog, arguments.teachers, **options)
+        if arguments.catalog
+        else FakeServer(**options)
+    )
+    server.start(port=arguments.port)
+    print(f"BANNER_URL={server.banner_url}")
+    print(f"RATEMYPROFESSOR_URL={server.graphql_url}")
+
+    try:
+        server._thread.join()
+    except KeyboardInterrupt:
+        server.stop()
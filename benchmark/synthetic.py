@@ -0,0 +1,266 @@
+from pydantic import Json
+from typing import List
+import random
+
+
+DayNames = ["sunday", "monday", "tuesday", "wednesday", "thursday", "friday", "saturday"]
+
+# Weekly meeting patterns used by most sections
+DayPatterns = [("monday", "wednesday", "friday"), ("tuesday", "thursday"), ("monday", "wednesday"), ("wednesday",)]
+
+
+# Block that every contested section meets in, so contested sections of different courses always conflict
+ContestedBlock = (("monday", "wednesday", "friday"), 10 * 60, 10 * 60 + 50)
+
+# Draws allowed per meeting before a section is given up on, as its blocks may leave no room for another
+MaxMeetingDraws = 1000
+
+
+def random_meeting(_rng: random.Random) -> tuple:
+    """Pick a random weekly pattern and start time, returning the days, start and end minutes."""
+    days = _rng.choice(DayPatterns)
+    start = _rng.randrange(8 * 60, 19 * 60, 30)
+    return days, start, start + (50 if len(days) == 3 else 80)
+
+
+def generate_section(
+    _rng: random.Random,
+    *,
+    term: str,
+    crn: str,
+    subject: str,
+    number: str,
+    sequence: str,
+    meetings: int = 1,
+    contested: bool = False,
+    online: bool = False,
+) -> Json:
+    """
+    Generate a Banner search record for one section with random meeting times and instructor.
+
+    Args:
+        _rng: Random generator, so that records are reproducible.
+        term: Term code of the section.
+        crn: Course reference number.
+        subject: Subject code, such as "CIS".
+        number: Course number, such as "1068".
+        sequence: Section number, such as "001".
+        meetings: Number of weekly meeting blocks, which never overlap each other.
+        contested: Whether the first meeting is placed in `ContestedBlock`.
+        online: Whether the section is an online class without meeting times.
+    """
+    blocks = []
+    draws = 0
+    while not online and len(blocks) < meetings:
+        assert draws < meetings * MaxMeetingDraws, f"could not fit {meetings} meetings without overlaps in a week"
+        draws += 1
+        days, start, end = ContestedBlock if contested and not blocks else random_meeting(_rng)
+
+        # Redraw blocks that would overlap an earlier block of the same section
+        if not any(set(days) & set(other[0]) and start < other[2] and other[1] < end for other in blocks):
+            blocks.append((days, start, end))
+
+    seats = _rng.randint(0, 40)
+    faculty = f"{_rng.choice(['Smith', 'Nguyen', 'Garcia', 'Kim', 'Patel', 'Brown'])}, {_rng.choice('ABCDEFGH')}."
+
+    meeting_times = [
+        {
+            "beginTime": f"{start // 60:02}{start % 60:02}",
+            "building": "TUTTLE",
+            "buildingDescription": "Tuttleman Learning Center",
+            "campus": "MN",
+            "campusDescription": "Main",
+            "category": "01",
+            "courseReferenceNumber": crn,
+            "creditHourSession": 3.0,
+            "endDate": "05/05/2025",
+            "endTime": f"{end // 60:02}{end % 60:02}",
+            "hoursWeek": round(len(days) * (end - start) / 60, 2),
+            "meetingScheduleType": "LEC",
+            "meetingType": "CLAS",
+            "meetingTypeDescription": "Class",
+            "room": str(_rng.randint(100, 400)),
+            "startDate": "01/13/2025",
+            "term": term,
+            **{day: day in days for day in DayNames},
+        }
+        for days, start, end in blocks
+    ]
+
+    return {
+        "id": int(crn),
+        "term": term,
+        "termDesc": "Spring 2025",
+        "courseReferenceNumber": crn,
+        "partOfTerm": "1",
+        "courseNumber": number,
+        "subject": subject,
+        "subjectDescription": subject.title(),
+        "sequenceNumber": sequence,
+        "campusDescription": "Main",
+        "scheduleTypeDescription": "Lecture",
+        "courseTitle": f"{subject} {number} Title",
+        "creditHours": 3,
+        "maximumEnrollment": 40,
+        "enrollment": 40 - seats,
+        "seatsAvailable": seats,
+        "waitCapacity": 10,
+        "waitCount": 0,
+        "waitAvailable": 10,
+        "crossList": None,
+        "crossListCapacity": None,
+        "crossListCount": None,
+        "crossListAvailable": None,
+        "creditHourHigh": None,
+        "creditHourLow": 3,
+        "creditHourIndicator": None,
+        "openSection": seats > 0,
+        "linkIdentifier": None,
+        "isSectionLinked": False,
+        "subjectCourse": f"{subject}{number}",
+        "faculty": [
+            {
+                "bannerId": str(_rng.randint(900000000, 999999999)),
+                "category": "01",
+                "courseReferenceNumber": crn,
+                "displayName": faculty,
+                "emailAddress": None,
+                "primaryIndicator": True,
+                "term": term,
+            }
+        ],
+        "meetingsFaculty": [
+            {
+                "category": "01",
+                "courseReferenceNumber": crn,
+                "faculty": [],
+                "meetingTime": meeting_time,
+                "term": term,
+            }
+            for meeting_time in meeting_times
+        ],
+        "status": {
+            "select": True,
+            "sectionOpen": seats > 0,
+            "timeConflict": False,
+            "restricted": False,
+            "sectionStatus": True,
+        },
+        "reservedSeatSummary": None,
+        "sectionAttributes": [],
+        "instructionalMethod": "OLL" if online else "CLAS",
+        "instructionalMethodDescription": "Online" if online else "Classroom",
+        "bookstores": [],
+        "feeAmount": None,
+    }
+
+
+def generate_records(
+    *,
+    courses: int,
+    sections_per_course: int,
+    term: str = "202503",
+    seed: int = 2025,
+    meetings_per_section: int = 1,
+    conflict_rate: float = 0.0,
+    online_rate: float = 0.0,
+) -> List[Json]:
+    """
+    Generate the Banner search records of a synthetic term.
+
+    Args:
+        courses: Number of courses.
+        sections_per_course: Number of sections of every course.
+        term: Term code of the sections.
+        seed: Seed of the random generator.
+        meetings_per_section: Weekly meeting blocks of every in-person section, which sets the meeting density.
+        conflict_rate: Probability that a section meets in the contested block, which makes it conflict with
+            every other contested section. Other sections only conflict by chance.
+        online_rate: Probability that a section is online without meeting times.
+    """
+    assert 0 <= conflict_rate <= 1 and 0 <= online_rate <= 1, "rates must be in the range 0 - 1"
+
+    rng = random.Random(seed)
+    subjects = ["CIS", "MATH", "PHYS", "CHEM", "BIOL", "ENG", "HIST", "ECON"]
+    records = []
+
+    for course in range(courses):
+        subject = subjects[course % len(subjects)]
+        number = f"{1000 + course:04}"
+
+        for section in range(sections_per_course):
+            crn = f"{10000 + len(records)}"
+            online = online_rate > 0 and rng.random() < online_rate
+            contested = conflict_rate > 0 and rng.random() < conflict_rate
+            records.append(
+                generate_section(
+                    rng,
+                    term=term,
+                    crn=crn,
+                    subject=subject,
+                    number=number,
+                    sequence=f"{section + 1:03}",
+                    meetings=meetings_per_section,
+                    contested=contested,
+                    online=online,
+                )
+            )
+    return records
+
+
+def generate_school(*, school_id: str = "U2Nob29sLTk5OQ==", name: str = "Synthetic University") -> Json:
+    """Generate a RateMyProfessor school record."""
+    return {
+        "avgRatingRounded": 3.8,
+        "city": "Philadelphia",
+        "country": "US",
+        "departments": [{"id": "RGVwYXJ0bWVudC0x", "name": "Computer Science"}],
+        "id": school_id,
+        "legacyId": 999,
+        "name": name,
+        "numRatings": 1000,
+        "state": "PA",
+        "summary": {
+            field: 3.5
+            for field in [
+                "campusCondition",
+                "campusLocation",
+                "careerOpportunities",
+                "clubAndEventActivities",
+                "foodQuality",
+                "internetSpeed",
+                "libraryCondition",
+                "schoolReputation",
+                "schoolSafety",
+                "schoolSatisfaction",
+                "socialActivities",
+            ]
+        },
+    }
+
+
+def generate_teachers(_records: List[Json], _school: Json, *, seed: int = 2025) -> List[Json]:
+    """Generate a RateMyProfessor teacher record with random ratings for every instructor of the sections."""
+    rng = random.Random(seed)
+    names = dict.fromkeys(faculty["displayName"] for record in _records for faculty in record["faculty"])
+    teachers = []
+
+    for index, name in enumerate(names):
+        last, _, first = name.partition(", ")
+        teachers.append(
+            {
+                "avgDifficultyRounded": round(rng.uniform(1, 5), 1),
+                "avgRatingRounded": round(rng.uniform(1, 5), 1),
+                "department": "Computer Science",
+                "departmentId": "RGVwYXJ0bWVudC0x",
+                "firstName": first.rstrip("."),
+                "id": f"VGVhY2hlci0{index}",
+                "isSaved": False,
+                "lastName": last,
+                "legacyId": 100000 + index,
+                "numRatings": rng.randint(1, 200),
+                "school": _school,
+                "wouldTakeAgainPercentRounded": round(rng.uniform(0, 100)),
+            }
+        )
+    return teachers
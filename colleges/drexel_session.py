@@ -5,9 +5,11 @@ from selenium.webdriver.chrome.options import Options
 from selenium.webdriver.common.by import By
 from selenium import webdriver
 from school.session import SchoolSession
+from school.section_filter import SectionFilter
 from school.courses import CourseSection, Term
 from functools import cache
 from typing import List, Optional
+from pydantic import Json
 
 
 class DUPage:
@@ -35,3 +37,19 @@ class DUSession(SchoolSession):
     @cache
     def get_terms(self, *, max: int) -> List[Term]:
         raise NotImplementedError
+
+    def _fetch_course_records(
+        self,
+        _course: str,
+        *,
+        term: int,
+        context: Optional[str] = None,
+        section_filter: Optional[SectionFilter] = None,
+    ) -> List[Json]:
+        raise NotImplementedError
+
+    def _fetch_term_records(self, *, term: int) -> List[Json]:
+        raise NotImplementedError
+
+    def _probe(self) -> bool:
+        raise NotImplementedError
@@ -4,20 +4,31 @@ from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.chrome.options import Options
 from selenium.webdriver.common.by import By
 from selenium import webdriver
+from pydantic import Json
+from school.section_filter import SectionFilter
 from school.session import SchoolSession
 from school.courses import CourseSection, Term
+from concurrent.futures import ThreadPoolExecutor
 from functools import cache
-from typing import List, Optional
+from typing import Dict, Iterable, List, Optional, Tuple
+from queue import Queue
+import uuid
+import os
 
 
 class TUPage:
+    # Self service banner, which the search urls below are relative to
+    Base = "https://prd-xereg.temple.edu/StudentRegistrationSsb/ssb"
+
     # Urls that get information about courses and terms
-    Terms = "https://prd-xereg.temple.edu/StudentRegistrationSsb/ssb/plan/getTerms"
-    CourseInfo = "https://prd-xereg.temple.edu/StudentRegistrationSsb/ssb/searchResults/searchResults"
+    Terms = "/plan/getTerms"
+    CourseInfo = "/searchResults/searchResults"
+    LinkedSections = "/searchResults/fetchLinkedSections"
+    Campuses = "/classSearch/get_campus"
 
     # Post urls that are required to getting new information
-    PlanMode = "https://prd-xereg.temple.edu/StudentRegistrationSsb/ssb/term/search?mode=plan"
-    ResetDataForm = "https://prd-xereg.temple.edu/StudentRegistrationSsb/ssb/courseSearch/resetDataForm"
+    PlanMode = "/term/search?mode=plan"
+    ResetDataForm = "/courseSearch/resetDataForm"
 
     # Pages that you are required to visit (otherwise you cannot search for courses)
     Login = "https://tuportal.temple.edu"
@@ -26,6 +37,22 @@ class TUPage:
 
 
 class TUSession(SchoolSession):
+    _base_url: str
+    _search_contexts: List[str]
+    _linked_sections: Dict[Tuple[int, str], List[List[str]]]
+
+    def __init__(self, *, base_url: Optional[str] = None, **kwargs):
+        """
+        Args:
+            base_url: Self service banner url to search against, such as a local stand-in server. Defaults to the
+                `BANNER_URL` environment variable, then Temple's server.
+            **kwargs: Passed to `SchoolSession`.
+        """
+        super().__init__(**kwargs)
+        self._base_url = (base_url or os.environ.get("BANNER_URL") or TUPage.Base).rstrip("/")
+        self._search_contexts = []
+        self._linked_sections = {}
+
     @property
     def id(self) -> str:
         return "U2Nob29sLTk5OQ=="
@@ -36,7 +63,12 @@ class TUSession(SchoolSession):
         username: Optional[str] = None,
         password: Optional[str] = None,
         disable_gui: bool = False,
+        reuse_cookies: bool = True,
     ):
+        # The browser is only needed when the saved cookies have expired
+        if reuse_cookies and self.restore_login():
+            return
+
         try:
             options = Options()
             options.add_argument("--start-maximized")  # Start maximized
@@ -74,13 +106,12 @@ class TUSession(SchoolSession):
             link.click()
 
             # Grab required cookies from current session (required for future requests)
-            self._session.cookies.update(
+            self._save_login(
                 {
                     "JSESSIONID": driver.get_cookie("JSESSIONID")["value"],
                     "BIGipServerprd_xereg_8180_pool": driver.get_cookie("BIGipServerprd_xereg_8180_pool")["value"],
                 }
             )
-            self._authenticated = True
             # print(json.dumps({cookie["name"]: cookie["value"] for cookie in driver.get_cookies()}, indent=4))
 
             # The browser is no longer required after the session is created
@@ -90,19 +121,169 @@ class TUSession(SchoolSession):
         except Exception as error:
             print("Failed to create session:", error)
 
-    @cache
-    def get_course_sections(self, _course: str, *, term: int) -> List[CourseSection]:
+    def get_course_sections_many(
+        self,
+        _courses: Iterable[str],
+        *,
+        term: int,
+        max_seat_age: Optional[float] = None,
+        section_filter: Optional[SectionFilter] = None,
+        max_workers: int = 8,
+    ) -> Dict[str, List[CourseSection]]:
+        """
+        Fetch the sections of several courses in parallel, each through its own Banner search context.
+
+        Banner keeps the search state of a session per `uniqueSessionId`, so every worker resets and searches
+        under its own id while sharing the authenticated cookies. Courses that fail to load are left out.
+        """
+        assert max_workers > 0, "max workers must be greater than zero"
+
+        if term in self._snapshots:
+            return super().get_course_sections_many(
+                _courses, term=term, max_seat_age=max_seat_age, section_filter=section_filter
+            )
+
+        courses = list(dict.fromkeys(_courses))
+        workers = min(max_workers, len(courses))
+        results: Dict[str, List[CourseSection]] = {}
+
+        if workers > 0:
+            # Search contexts are reused between calls, each one is only used by a single worker at a time
+            while len(self._search_contexts) < workers:
+                self._search_contexts.append(uuid.uuid4().hex[:18])
+
+            contexts: Queue = Queue()
+            for context in self._search_contexts[:workers]:
+                contexts.put(context)
+
+            def fetch(_course: str) -> List[CourseSection]:
+                context = contexts.get()
+                try:
+                    return self._load_course_sections(
+                        _course,
+                        term=term,
+                        max_seat_age=max_seat_age,
+                        context=context,
+                        section_filter=section_filter,
+                    )
+                finally:
+                    contexts.put(context)
+
+            with ThreadPoolExecutor(max_workers=workers) as executor:
+                futures = {course: executor.submit(fetch, course) for course in courses}
+
+                for course, future in futures.items():
+                    try:
+                        results[course] = future.result()
+                    except Exception:
+                        pass
+        return results
+
+    def _fetch_course_records(
+        self,
+        _course: str,
+        *,
+        term: int,
+        context: Optional[str] = None,
+        section_filter: Optional[SectionFilter] = None,
+    ) -> List[Json]:
+        # Searches made under a unique session id do not share state with other searches
+        search_context = {"uniqueSessionId": context} if context else {}
+        filter_params = self._filter_params(section_filter, term=term) if section_filter else {}
+
         # Refresh courses and sections (otherwise the server will cache the results)
-        self.send(TUPage.PlanMode, {"term": term})
-        self.send(TUPage.ResetDataForm, {"resetCourses": True, "resetSections": True})
+        self.send(self._page(TUPage.PlanMode), {"term": term, **search_context})
+        self.send(self._page(TUPage.ResetDataForm), {"resetCourses": True, "resetSections": True, **search_context})
 
         # Fetch all section info for selected courses
-        return [
-            CourseSection(**course)
-            for course in self.fetch_all(TUPage.CourseInfo, {"txt_subjectcoursecombo": _course, "txt_term": term})
-        ]
+        records = self.fetch_all(
+            self._page(TUPage.CourseInfo),
+            {"txt_subjectcoursecombo": _course, "txt_term": term, **filter_params, **search_context},
+        )
+
+        # A filtered search also finds nothing when no section matches, such as a full course with `open_only`,
+        # so only an unfiltered search can tell that the course does not exist
+        if not records and filter_params:
+            self._fetch_course_records(_course, term=term, context=context)
+
+        assert records or filter_params, "no data found"
+        return records
+
+    def _fetch_linked_sections(
+        self, _crns: Iterable[str], *, term: int, max_workers: int = 8
+    ) -> Optional[Dict[str, List[List[str]]]]:
+        """Ask Banner which sections are linked to each section, in parallel, remembering the answers."""
+        assert max_workers > 0, "max workers must be greater than zero"
+
+        crns = list(dict.fromkeys(_crns))
+        missing = [crn for crn in crns if (term, crn) not in self._linked_sections]
+
+        def fetch(_crn: str) -> List[List[str]]:
+            data = self.fetch(
+                self._page(TUPage.LinkedSections), {"term": term, "courseReferenceNumber": _crn}, json=True
+            )
+            return [[section["courseReferenceNumber"] for section in group] for group in data["linkedData"]]
+
+        if missing:
+            try:
+                with ThreadPoolExecutor(max_workers=min(max_workers, len(missing))) as executor:
+                    for crn, groups in zip(missing, executor.map(fetch, missing)):
+                        self._linked_sections[(term, crn)] = groups
+            except Exception:
+                return None
+        return {crn: self._linked_sections[(term, crn)] for crn in crns}
+
+    def _filter_params(self, _section_filter: SectionFilter, *, term: int) -> Json:
+        """Translate the parts of a filter that Banner's search supports into search parameters."""
+        params = {}
+
+        if _section_filter.open_only:
+            params["chk_open_only"] = "true"
+
+        # Banner filters on a single value per field, so filters with several values are left to the client
+        if _section_filter.instructional_methods is not None and len(_section_filter.instructional_methods) == 1:
+            params["txt_instructionalMethod"] = _section_filter.instructional_methods[0]
+
+        if _section_filter.campuses is not None and len(_section_filter.campuses) == 1:
+            if code := self.get_campuses(term=term).get(_section_filter.campuses[0]):
+                params["txt_campus"] = code
+        return params
+
+    @cache
+    def get_campuses(self, *, term: int) -> Dict[str, str]:
+        """Return the campus codes of the term keyed by campus description."""
+        try:
+            campuses = self.fetch(
+                self._page(TUPage.Campuses), {"searchTerm": "", "term": term, "offset": 1, "max": 100}, json=True
+            )
+            return {campus["description"]: campus["code"] for campus in campuses}
+        except Exception:
+            return {}
+
+    def _fetch_term_records(self, *, term: int) -> List[Json]:
+        self.send(self._page(TUPage.PlanMode), {"term": term})
+        self.send(self._page(TUPage.ResetDataForm), {"resetCourses": True, "resetSections": True})
+
+        # An empty subject matches every section of the term
+        records = self.fetch_all(self._page(TUPage.CourseInfo), {"txt_subject": "", "txt_term": term})
+
+        assert records, "no data found"
+        return records
+
+    def _page(self, _path: str) -> str:
+        return self._base_url + _path
+
+    def _probe(self) -> bool:
+        # An expired session is redirected to the login page instead of returning terms
+        try:
+            response = self._transport.get(
+                self._page(TUPage.Terms), params={"offset": 0, "max": 1}, allow_redirects=False
+            )
+            return response.status_code == 200 and isinstance(response.json(), list)
+        except Exception:
+            return False
 
     @cache
     def get_terms(self, *, max: int) -> List[Term]:
         # Fetch info for available terms
-        return [Term(**term) for term in self.fetch(TUPage.Terms, {"offset": 0, "max": max}, json=True)]
+        return [Term(**term) for term in self.fetch(self._page(TUPage.Terms), {"offset": 0, "max": max}, json=True)]
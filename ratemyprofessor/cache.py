@@ -0,0 +1,119 @@
+from util.instrument import Instrumentation
+from pydantic import Json
+from typing import Optional
+import threading
+import sqlite3
+import json
+import time
+import os
+
+
+def normalize_query(_search: str) -> str:
+    """Normalize a search string so that differently spaced or cased queries share a cache entry."""
+    return " ".join(_search.lower().split())
+
+
+class RatingCache:
+    """
+    Persistent cache of parsed RateMyProfessor records backed by a local SQLite file.
+
+    Entries expire after `ttl` seconds and the oldest entries are evicted once the cache holds more than
+    `max_entries` records. The database runs in WAL mode with one connection per thread so that several
+    worker processes can read it while another one writes.
+    """
+
+    _path: str
+    _ttl: Optional[float]
+    _max_entries: Optional[int]
+    _local: threading.local
+    _lock: threading.Lock
+    _writes: int
+
+    # Number of writes between two eviction passes (counting rows on every write is wasteful)
+    EvictInterval = 128
+
+    def __init__(
+        self,
+        _path: str = ".cache/ratemyprofessor.sqlite",
+        *,
+        ttl: Optional[float] = 7 * 24 * 60 * 60,
+        max_entries: Optional[int] = 100_000,
+    ):
+        assert ttl is None or ttl > 0, "ttl must be greater than zero"
+        assert max_entries is None or max_entries > 0, "max entries must be greater than zero"
+
+        self._path = _path
+        self._ttl = ttl
+        self._max_entries = max_entries
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._writes = 0
+
+    @property
+    def _connection(self) -> sqlite3.Connection:
+        # SQLite connections cannot be shared between threads, so every thread opens its own
+        connection = getattr(self._local, "connection", None)
+
+        if connection is None:
+            if directory := os.path.dirname(self._path):
+                os.makedirs(directory, exist_ok=True)
+
+            connection = sqlite3.connect(self._path, timeout=30, isolation_level=None)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS entries (key TEXT PRIMARY KEY, value TEXT NOT NULL, created REAL NOT NULL)"
+            )
+            connection.execute("CREATE INDEX IF NOT EXISTS entries_created ON entries (created)")
+            self._local.connection = connection
+        return connection
+
+    def get(self, _key: str) -> Optional[Json]:
+        """Return the stored record for the key, or None if it is missing or expired."""
+        row = self._connection.execute("SELECT value, created FROM entries WHERE key = ?", (_key,)).fetchone()
+
+        if row is None:
+            Instrumentation.count("ratings.cache_miss")
+            return None
+
+        value, created = row
+        if self._ttl is not None and time.time() - created > self._ttl:
+            Instrumentation.count("ratings.cache_miss")
+            return None
+
+        Instrumentation.count("ratings.cache_hit")
+        return json.loads(value)
+
+    def set(self, _key: str, _value: Json):
+        """Store a record under the key, replacing any previous value."""
+        self._connection.execute(
+            "INSERT OR REPLACE INTO entries (key, value, created) VALUES (?, ?, ?)",
+            (_key, json.dumps(_value, separators=(",", ":")), time.time()),
+        )
+
+        # Prefetch threads write concurrently, and each count must trigger at most one eviction pass
+        with self._lock:
+            self._writes += 1
+            due = self._writes % self.EvictInterval == 0
+
+        if due:
+            self.evict()
+
+    def evict(self):
+        """Remove expired entries and trim the cache down to its maximum size."""
+        connection = self._connection
+
+        if self._ttl is not None:
+            connection.execute("DELETE FROM entries WHERE created < ?", (time.time() - self._ttl,))
+
+        if self._max_entries is not None:
+            connection.execute(
+                "DELETE FROM entries WHERE key IN (SELECT key FROM entries ORDER BY created DESC LIMIT -1 OFFSET ?)",
+                (self._max_entries,),
+            )
+
+    def clear(self):
+        self._connection.execute("DELETE FROM entries")
+
+    def __len__(self) -> int:
+        return self._connection.execute("SELECT COUNT(*) FROM entries").fetchone()[0]
@@ -1,8 +1,13 @@
+from ratemyprofessor.cache import RatingCache, normalize_query
+from concurrent.futures import ThreadPoolExecutor
+from util.instrument import Instrumentation
+from util.rate_limit import RateLimiter
+from util.transport import Transport
 from functools import cache
 from pydantic import BaseModel, Json
-from typing import List, Dict, Optional
-import requests
+from typing import List, Dict, Iterable, Optional
 import base64
+import os
 
 
 def b64decode(_str: str):
@@ -79,15 +84,29 @@ class RateMyProfessor:
     Auth = f"Basic {b64encode("test:test")}"
     Url = "https://www.ratemyprofessors.com/graphql"
 
-    def __init__(self):
-        self._session = requests.Session()
-        self._session.headers.update({"Authorization": self.Auth})
+    def __init__(
+        self,
+        *,
+        url: Optional[str] = None,
+        cache: Optional[RatingCache] = None,
+        transport: Optional[Transport] = None,
+    ):
+        self._url = url or os.environ.get("RATEMYPROFESSOR_URL") or self.Url
+        self._transport = transport or Transport()
+        self._transport.session.headers.update({"Authorization": self.Auth})
+
+        # Parsed records are kept on disk so that searches survive kernel restarts
+        self._cache = cache if cache is not None else RatingCache()
 
         with open("ratemyprofessor/query.gql", "r") as file:
             self._query = file.read()
 
     def query(self, _json: Dict[str, any]) -> Optional[Json]:
-        response = self._session.post(self.Url, json=_json)
+        with Instrumentation.span("ratings.query"):
+            response = self._transport.post(self._url, json=_json)
+
+        Instrumentation.count("ratings.requests")
+        Instrumentation.count("ratings.bytes", len(response.content))
         if response.status_code == 200:
             result = response.json()
             if "errors" not in result:
@@ -96,6 +115,10 @@ class RateMyProfessor:
 
     @cache
     def get_schools(self, _search: str, *, offset=-1, max=10) -> List[School]:
+        key = f"schools:{normalize_query(_search)}:{offset}:{max}"
+        if (records := self._cache.get(key)) is not None:
+            return [School(**record) for record in records]
+
         result = self.query(
             {
                 "query": self._query,
@@ -110,11 +133,17 @@ class RateMyProfessor:
             }
         )
         if result:
-            return [School(**school["node"]) for school in result["data"]["search"]["schools"]["edges"]]
+            schools = [School(**school["node"]) for school in result["data"]["search"]["schools"]["edges"]]
+            self._cache.set(key, [school.model_dump() for school in schools])
+            return schools
         return []
 
     @cache
     def get_teachers(self, _search: str, _school_id: str, *, offset=-1, max=10) -> List[Teacher]:
+        key = f"teachers:{_school_id}:{normalize_query(_search)}:{offset}:{max}"
+        if (records := self._cache.get(key)) is not None:
+            return [Teacher(**record) for record in records]
+
         result = self.query(
             {
                 "query": self._query,
@@ -131,15 +160,190 @@ class RateMyProfessor:
             }
         )
         if result:
-            return [
+            teachers = [
                 teacher_obj
                 for teacher in result["data"]["search"]["teachers"]["edges"]
                 if (teacher_obj := Teacher(**teacher["node"])).school.id == _school_id
             ]
+            self._cache.set(key, [teacher.model_dump() for teacher in teachers])
+            return teachers
         return []
 
+    def get_all_teachers(self, _school_id: str, *, page_size=1000) -> List[Teacher]:
+        """Download every teacher of a school by walking through all pages of an empty search."""
+        teachers: List[Teacher] = []
+        cursor = b64encode("arrayconnection:-1")
+
+        while True:
+            result = self.query(
+                {
+                    "query": self._query,
+                    "variables": {
+                        "count": page_size,
+                        "cursor": cursor,
+                        "query": {
+                            "text": "",
+                            "schoolID": _school_id,
+                        },
+                    },
+                    "operationName": "TeacherSearchPaginationQuery",
+                }
+            )
+            assert result, "failed to retrieve the teachers of the school"
+
+            connection = result["data"]["search"]["teachers"]
+            teachers.extend(
+                teacher_obj
+                for teacher in connection["edges"]
+                if (teacher_obj := Teacher(**teacher["node"])).school.id == _school_id
+            )
+
+            if not connection["pageInfo"]["hasNextPage"]:
+                break
+            cursor = connection["pageInfo"]["endCursor"]
+        return teachers
+
+    def get_teachers_many(
+        self,
+        _searches: Iterable[str],
+        _school_id: str,
+        *,
+        max=10,
+        batch_size=25,
+    ) -> Dict[str, List[Teacher]]:
+        """
+        Search for many teachers at once by packing the searches into aliased GraphQL documents.
+
+        Args:
+            _searches: Teacher names to search for.
+            _school_id: Only teachers from this school are returned.
+            max: Maximum number of results for each search.
+            batch_size: Maximum number of searches sent in a single request.
+
+        Returns:
+            Dict[str, List[Teacher]]: The teachers found for each search, keyed by the search as given.
+        """
+        assert batch_size > 0, "batch size must be greater than zero"
+
+        results: Dict[str, List[Teacher]] = {}
+        missing: Dict[str, List[str]] = {}
+
+        # Serve what we can from the cache and group the remaining searches by their normalized query
+        for search in _searches:
+            normalized = normalize_query(search)
+            key = f"teachers:{_school_id}:{normalized}:-1:{max}"
+
+            if (records := self._cache.get(key)) is not None:
+                results[search] = [Teacher(**record) for record in records]
+            else:
+                missing.setdefault(normalized, []).append(search)
+
+        queries = list(missing.keys())
+
+        for start in range(0, len(queries), batch_size):
+            batch = queries[start : start + batch_size]
+            result = self.query(
+                {
+                    "query": self._batch_query(len(batch)),
+                    "variables": {
+                        "count": max,
+                        **{
+                            f"q{index}": {"text": query, "schoolID": _school_id, "fallback": "true"}
+                            for index, query in enumerate(batch)
+                        },
+                    },
+                    "operationName": "TeacherSearchBatchQuery",
+                }
+            )
+
+            for index, query in enumerate(batch):
+                teachers = []
+
+                if result:
+                    teachers = [
+                        teacher_obj
+                        for teacher in result["data"][f"t{index}"]["teachers"]["edges"]
+                        if (teacher_obj := Teacher(**teacher["node"])).school.id == _school_id
+                    ]
+                    self._cache.set(
+                        f"teachers:{_school_id}:{query}:-1:{max}", [teacher.model_dump() for teacher in teachers]
+                    )
+
+                for search in missing[query]:
+                    results[search] = teachers
+        return results
+
+    def prefetch_teachers(
+        self,
+        _searches: Iterable[str],
+        _school_id: str,
+        *,
+        max=10,
+        batch_size=25,
+        max_workers=4,
+        rate: Optional[float] = 4.0,
+    ) -> Dict[str, List[Teacher]]:
+        """
+        Resolve many teacher searches concurrently so that their results are cached before they are needed.
+
+        Args:
+            _searches: Teacher names to search for.
+            _school_id: Only teachers from this school are returned.
+            max: Maximum number of results for each search.
+            batch_size: Maximum number of searches sent in a single request.
+            max_workers: Maximum number of requests in flight at the same time.
+            rate: Maximum number of requests started per second (None disables the limit).
+
+        Returns:
+            Dict[str, List[Teacher]]: The teachers found for each search, keyed by the search as given.
+        """
+        assert max_workers > 0, "max workers must be greater than zero"
+
+        searches = list(dict.fromkeys(_searches))
+        limiter = RateLimiter(rate) if rate is not None else None
+
+        def fetch_batch(_batch: List[str]) -> Dict[str, List[Teacher]]:
+            if limiter is not None:
+                limiter.acquire()
+            return self.get_teachers_many(_batch, _school_id, max=max, batch_size=batch_size)
+
+        results: Dict[str, List[Teacher]] = {}
+
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            batches = [searches[start : start + batch_size] for start in range(0, len(searches), batch_size)]
+            for batch_results in executor.map(fetch_batch, batches):
+                results.update(batch_results)
+        return results
+
+    @cache
+    def _batch_query(self, _size: int) -> str:
+        """Build a GraphQL document that runs `_size` aliased teacher searches in one request."""
+        variables = "".join(f"\n    $q{index}: TeacherSearchQuery!" for index in range(_size))
+        searches = "".join(
+            f"""
+    t{index}: newSearch {{
+        teachers(query: $q{index}, first: $count) {{
+            edges {{
+                node {{
+                    ...TeacherFields
+                }}
+            }}
+        }}
+    }}"""
+            for index in range(_size)
+        )
+
+        # Reuse the fragments from the regular query file so both documents request the same fields
+        fragments = self._query[self._query.index("fragment ") :]
+
+        return f"query TeacherSearchBatchQuery(\n    $count: Int!{variables}\n) {{{searches}\n}}\n\n{fragments}"
+
     @cache
     def get_school(self, _id: str) -> Optional[School]:
+        key = f"school:{_id}"
+        if (record := self._cache.get(key)) is not None:
+            return School(**record)
+
         result = self.query(
             {
                 "query": self._query,
@@ -150,11 +354,17 @@ class RateMyProfessor:
             }
         )
         if result:
-            return School(**result["data"]["node"])
+            school = School(**result["data"]["node"])
+            self._cache.set(key, school.model_dump())
+            return school
         return None
 
     @cache
     def get_teacher(self, _id: str) -> Optional[Teacher]:
+        key = f"teacher:{_id}"
+        if (record := self._cache.get(key)) is not None:
+            return Teacher(**record)
+
         result = self.query(
             {
                 "query": self._query,
@@ -165,7 +375,9 @@ class RateMyProfessor:
             }
         )
         if result:
-            return Teacher(**result["data"]["node"])
+            teacher = Teacher(**result["data"]["node"])
+            self._cache.set(key, teacher.model_dump())
+            return teacher
         return None
 
     @cache
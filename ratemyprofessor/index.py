@@ -0,0 +1,108 @@
+from ratemyprofessor.database import School, Teacher
+from typing import Dict, List, Optional, Tuple
+import unicodedata
+import json
+import gzip
+import time
+import os
+import re
+
+
+def name_tokens(_name: str) -> List[str]:
+    """
+    Split a person's name into normalized tokens ordered first name to last name.
+
+    Accents, punctuation and case are removed, and names written as "Last, First Middle" are reordered.
+    """
+    name = unicodedata.normalize("NFKD", _name).encode("ascii", "ignore").decode().lower()
+
+    if "," in name:
+        last, _, first = name.partition(",")
+        name = f"{first} {last}"
+
+    return re.sub(r"[^a-z0-9\s]", " ", name.replace("'", "")).split()
+
+
+class TeacherIndex:
+    """
+    Local index of every teacher of a school for matching faculty names without remote searches.
+
+    Names are matched on the full normalized name first, then on the first and last name tokens (ignoring
+    middle names) and finally, for names given with only a first initial, on the initial and last name when a
+    single teacher matches it.
+    """
+
+    _school: Optional[School]
+    _teachers: List[Teacher]
+    _by_name: Dict[str, List[Teacher]]
+    _by_tokens: Dict[Tuple[str, str], List[Teacher]]
+    _by_initial: Dict[Tuple[str, str], List[Teacher]]
+    created: float
+
+    def __init__(self, _teachers: List[Teacher], *, created: Optional[float] = None):
+        self._school = _teachers[0].school if _teachers else None
+        self._teachers = []
+        self._by_name = {}
+        self._by_tokens = {}
+        self._by_initial = {}
+        self.created = created if created is not None else time.time()
+
+        for teacher in _teachers:
+            self.add(teacher)
+
+    def add(self, _teacher: Teacher):
+        tokens = name_tokens(_teacher.get_name())
+        if not tokens:
+            return
+
+        self._teachers.append(_teacher)
+        self._by_name.setdefault(" ".join(tokens), []).append(_teacher)
+        self._by_tokens.setdefault((tokens[0], tokens[-1]), []).append(_teacher)
+        self._by_initial.setdefault((tokens[0][0], tokens[-1]), []).append(_teacher)
+
+    def lookup(self, _name: str) -> List[Teacher]:
+        """Return the teachers matching the name, using the most precise index that has a match."""
+        tokens = name_tokens(_name)
+        if not tokens:
+            return []
+
+        if teachers := self._by_name.get(" ".join(tokens)) or self._by_tokens.get((tokens[0], tokens[-1])):
+            return teachers
+
+        # An initial could stand for any first name, so it is only trusted when it is unambiguous
+        if len(tokens[0]) == 1:
+            teachers = self._by_initial.get((tokens[0], tokens[-1]), [])
+            if len(teachers) == 1:
+                return teachers
+        return []
+
+    def age(self) -> float:
+        """Return the number of seconds since the index was downloaded."""
+        return time.time() - self.created
+
+    def save(self, _path: str):
+        if directory := os.path.dirname(_path):
+            os.makedirs(directory, exist_ok=True)
+
+        # The school is the same for every teacher, so it is only stored once
+        with gzip.open(_path, "wt") as file:
+            json.dump(
+                {
+                    "created": self.created,
+                    "school": self._school.model_dump() if self._school else None,
+                    "teachers": [teacher.model_dump(exclude={"school"}) for teacher in self._teachers],
+                },
+                file,
+                separators=(",", ":"),
+            )
+
+    @classmethod
+    def load(cls, _path: str) -> "TeacherIndex":
+        with gzip.open(_path, "rt") as file:
+            data = json.load(file)
+
+        school = School(**data["school"]) if data["school"] else None
+        return cls([Teacher(**teacher, school=school) for teacher in data["teachers"]], created=data["created"])
+
+    def __len__(self) -> int:
+        return len(self._teachers)
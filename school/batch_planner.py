@@ -0,0 +1,267 @@
+from concurrent.futures import Future, ProcessPoolExecutor
+from school.course_builder import CourseBuilder, CourseIgnore, CourseSelect
+from school.courses import CourseSection, prefetch_teachers
+from school.section_filter import SectionFilter
+from school.section_table import SectionTable
+from school.schedule_metrics import MetricsAccumulator, ScheduleMetrics
+from school.session import SchoolSession
+from school.schedule import SchedulePlot
+from util.instrument import Instrumentation
+from pydantic import BaseModel, StringConstraints
+from typing import Callable, Dict, List, Optional, Sequence, Set, Tuple
+from typing_extensions import Annotated
+import tempfile
+import heapq
+import os
+
+# Name of a `SectionTable` scorer, prefixed with "-" to sort in descending order (e.g. "-teacher_rating")
+SortConstraint = Annotated[str, StringConstraints(pattern=r"^-?(week_range|week_total|between_total|teacher_rating)$")]
+
+# Scores a request can sort by, read from the metrics accumulated while searching
+MetricScorers: Dict[str, Callable[[ScheduleMetrics], float]] = {
+    "week_range": lambda metrics: metrics.week_range,
+    "week_total": lambda metrics: metrics.week_total,
+    "between_total": lambda metrics: metrics.between_total,
+    "teacher_rating": lambda metrics: metrics.teacher_rating(),
+}
+
+# Sections every unregistered course is narrowed to, the same for every request so that courses are fetched once
+SharedFilter = SectionFilter(campuses=("Main",), instructional_methods=("CLAS", "OLL"))
+
+
+class PlanRequest(BaseModel, frozen=True):
+    """The courses one student wants scheduled, as they would be given to a `CourseBuilder`."""
+
+    select: Tuple[CourseSelect, ...]
+    ignore: Tuple[CourseIgnore, ...] = ()
+    sort: Tuple[SortConstraint, ...] = ()
+    max: Optional[int] = None
+
+
+class PlanResult(BaseModel):
+    request: PlanRequest
+    # Course reference numbers of every schedule, in sorted order
+    schedules: List[Tuple[str, ...]] = []
+    error: Optional[str] = None
+
+
+def candidate_rows(
+    _session: SchoolSession, _table: SectionTable, _request: PlanRequest, *, term: int
+) -> List[List[Tuple[int, ...]]]:
+    """
+    Units of rows each selected course of a request may use, filtered and linked the same way `CourseBuilder`
+    does.
+    """
+    builder = CourseBuilder(_session)
+    builder.select_term(term)
+    builder.ignore(list(_request.ignore))
+    candidates = []
+
+    for selected_course in _request.select:
+        assert selected_course.course in _table.courses, f"{selected_course.course} is not a valid course"
+        rows = _table.course_rows(selected_course.course)
+
+        if selected_course.section:
+            rows = [row for row in rows if selected_course.should_accept(_table.get_section(row))]
+
+            assert rows, f"{selected_course.course} has no section numbered {selected_course.section}"
+            candidates.append([(row,) for row in rows])
+        else:
+            rows = [row for row in rows if builder._section_ignore_filter(_table.get_section(row))]
+
+            assert rows, f"{selected_course.course} has no available sections"
+            units = builder._link_units(_table, rows)
+
+            assert units, f"{selected_course.course} has no sections that can be registered together"
+            candidates.append(units)
+    return candidates
+
+
+# Tables opened by a worker process, by path, so that each is only mapped once per worker
+_worker_tables: Dict[str, SectionTable] = {}
+
+
+def solve_in_worker(
+    _path: str,
+    _candidates: List[List[Tuple[int, ...]]],
+    _sort: Tuple[str, ...],
+    _max: Optional[int],
+    *,
+    deadline: Optional[float] = None,
+) -> List[Tuple[int, ...]]:
+    """Run `solve` in a worker process against the table saved at `_path`."""
+    if _path not in _worker_tables:
+        _worker_tables[_path] = SectionTable.open(_path)
+    return solve(_worker_tables[_path], _candidates, _sort, _max, deadline=deadline)
+
+
+def solve(
+    _table: SectionTable,
+    _candidates: List[List[Tuple[int, ...]]],
+    _sort: Tuple[str, ...],
+    _max: Optional[int],
+    *,
+    deadline: Optional[float] = None,
+) -> List[Tuple[int, ...]]:
+    """
+    Find the combinations of rows without conflicts, sorted by the named scorers and cut to `_max`.
+
+    Scores are accumulated while searching, so the ratings of every candidate row must be loaded. Raises
+    `TimeoutError` once the search runs past `deadline` (a `time.time()` timestamp), so that a worker is not
+    kept busy by a search whose result nobody waits for anymore.
+    """
+    scorers = [(MetricScorers[name.lstrip("-")], -1 if name.startswith("-") else 1) for name in _sort]
+    accumulator = MetricsAccumulator(_table) if scorers else None
+
+    combinations = []
+    keys = []
+    for combination in CourseBuilder._search(_table, _candidates, accumulator=accumulator, deadline=deadline):
+        combinations.append(combination)
+        if accumulator is not None:
+            metrics = accumulator.metrics()
+            keys.append(tuple(sign * scorer(metrics) for scorer, sign in scorers))
+
+    if not scorers:
+        return combinations if _max is None else combinations[:_max]
+
+    # Keeps only the best schedules on a heap instead of sorting all of them, in the same stable order
+    indices = range(len(combinations))
+    if _max is None:
+        order = sorted(indices, key=keys.__getitem__)
+    else:
+        order = heapq.nsmallest(_max, indices, key=keys.__getitem__)
+    return [combinations[index] for index in order]
+
+
+class BatchPlanner:
+    """
+    Plans schedules for many students of the same term at once.
+
+    Every course needed by any request is loaded once, all of them are compiled into a single `SectionTable`
+    with their conflict masks and ratings, and each request only filters the rows of its courses and searches
+    them. With workers, the table is saved once and mapped by every worker process instead of being copied to
+    each of them, so the cost grows with the number of distinct courses rather than the number of students.
+    """
+
+    _session: SchoolSession
+    _term: int
+    _max_workers: int
+    _table: Optional[SectionTable]
+    _rows_by_crn: Dict[str, int]
+
+    def __init__(self, _session: SchoolSession, *, term: int, max_workers: int = 0):
+        """
+        Args:
+            _session: Session the courses are loaded from.
+            term: Term every request is planned for.
+            max_workers: Worker processes the searches are spread over, or 0 to search in this process.
+        """
+        assert max_workers >= 0, "max workers must not be negative"
+
+        self._session = _session
+        self._term = term
+        self._max_workers = max_workers
+        self._table = None
+        self._rows_by_crn = {}
+
+    def plan(self, _requests: Sequence[PlanRequest]) -> List[PlanResult]:
+        """Plan every request, returning one result per request in the same order."""
+        Instrumentation.count("batch.requests", len(_requests))
+
+        with Instrumentation.span("batch.load"):
+            loaded = self._load_courses(_requests)
+
+        with Instrumentation.span("batch.table"):
+            table = self._table = SectionTable.from_sections(
+                section for course_sections in loaded.values() for section in course_sections
+            )
+            self._rows_by_crn = {table.get_crn(row): row for row in range(len(table))}
+            prefetch_teachers(table.sections, self._session.id)
+            table.load_ratings(self._session.id)
+
+        results = [PlanResult(request=request) for request in _requests]
+        jobs: Dict[int, List[List[Tuple[int, ...]]]] = {}
+        for index, request in enumerate(_requests):
+            try:
+                jobs[index] = candidate_rows(self._session, table, request, term=self._term)
+            except AssertionError as error:
+                results[index].error = str(error)
+
+        with Instrumentation.span("batch.solve"):
+            for index, rows in self._solve_all(table, _requests, jobs).items():
+                results[index].schedules = [tuple(table.get_crn(row) for row in combination) for combination in rows]
+        return results
+
+    def plots(self, _result: PlanResult) -> List[SchedulePlot]:
+        """Build the schedules of a result from the last planned table, ready to be printed or plotted."""
+        assert self._table is not None, "nothing has been planned"
+
+        schedules = []
+        for crns in _result.schedules:
+            rows = [self._rows_by_crn[crn] for crn in crns]
+            schedules.append(
+                SchedulePlot(self._table.get_sections(rows), school_id=self._session.id, table=self._table, rows=rows)
+            )
+        return schedules
+
+    def _load_courses(self, _requests: Sequence[PlanRequest]) -> Dict[str, List[CourseSection]]:
+        """Load every course of the requests once, with the widest filter and freshest seats any request needs."""
+        courses: Dict[str, Tuple[Optional[SectionFilter], bool]] = {}
+        registered: Set[str] = set()
+        fresh: Set[str] = set()
+
+        for request in _requests:
+            for selected_course in request.select:
+                if selected_course.section:
+                    registered.add(selected_course.course)
+            for ignored_course in request.ignore:
+                if ignored_course.waitlist is not None:
+                    fresh.add(ignored_course.course)
+
+        for request in _requests:
+            for selected_course in request.select:
+                course = selected_course.course
+                # Registered sections are kept wherever they are taught, so those courses are loaded whole
+                courses[course] = (None if course in registered else SharedFilter, course in fresh)
+
+        groups: Dict[Tuple[Optional[SectionFilter], bool], List[str]] = {}
+        for course, key in courses.items():
+            groups.setdefault(key, []).append(course)
+
+        loaded: Dict[str, List[CourseSection]] = {}
+        for (section_filter, is_fresh), group in groups.items():
+            loaded.update(
+                self._session.get_course_sections_many(
+                    group, term=self._term, max_seat_age=0 if is_fresh else None, section_filter=section_filter
+                )
+            )
+
+        Instrumentation.count("batch.courses", len(loaded))
+        return {course: sections for course, sections in loaded.items() if sections}
+
+    def _solve_all(
+        self, _table: SectionTable, _requests: Sequence[PlanRequest], _jobs: Dict[int, List[List[Tuple[int, ...]]]]
+    ) -> Dict[int, List[Tuple[int, ...]]]:
+        if self._max_workers == 0 or len(_jobs) <= 1:
+            return {
+                index: solve(_table, candidates, _requests[index].sort, _requests[index].max)
+                for index, candidates in _jobs.items()
+            }
+
+        # Workers map the same saved table, including the rating columns loaded above
+        os.makedirs(".cache", exist_ok=True)
+        descriptor, path = tempfile.mkstemp(prefix=f"batch-{self._term}-", suffix=".table", dir=".cache")
+        os.close(descriptor)
+
+        try:
+            _table.save(path)
+            with ProcessPoolExecutor(self._max_workers) as executor:
+                futures: Dict[int, Future] = {
+                    index: executor.submit(
+                        solve_in_worker, path, candidates, _requests[index].sort, _requests[index].max
+                    )
+                    for index, candidates in _jobs.items()
+                }
+                return {index: future.result() for index, future in futures.items()}
+        finally:
+            os.remove(path)
@@ -0,0 +1,122 @@
+from ratemyprofessor.index import name_tokens
+from school.section_table import SectionTable
+from school.courses import CourseSection, parse_sections
+from typing import Dict, Iterable, List, Optional
+from pydantic import Json
+import json
+import gzip
+import time
+import os
+
+
+class CatalogSnapshot:
+    """
+    Every section of a term downloaded at once and indexed for local lookups.
+
+    Raw records are stored as returned by the school so the snapshot file stays a faithful copy, and are only
+    parsed into `CourseSection` objects the first time they are requested. The groups of sections linked to
+    each section are stored with them when the school provides them.
+    """
+
+    term: int
+    created: float
+    _records: List[Json]
+    _links: Optional[Dict[str, List[List[str]]]]
+    _parsed: Dict[int, CourseSection]
+    _by_course: Dict[str, List[int]]
+    _by_crn: Dict[str, int]
+    _by_instructor: Dict[str, List[int]]
+
+    def __init__(
+        self,
+        _term: int,
+        _records: List[Json],
+        *,
+        sections: Optional[List[CourseSection]] = None,
+        links: Optional[Dict[str, List[List[str]]]] = None,
+        created: Optional[float] = None,
+    ):
+        self.term = _term
+        self.created = created if created is not None else time.time()
+        self._records = _records
+        self._links = links
+        self._parsed = dict(enumerate(sections)) if sections is not None else {}
+        self._by_course = {}
+        self._by_crn = {}
+        self._by_instructor = {}
+
+        for index, record in enumerate(_records):
+            self._by_course.setdefault(record["subjectCourse"], []).append(index)
+            self._by_crn[record["courseReferenceNumber"]] = index
+
+            for faculty in record["faculty"]:
+                self._by_instructor.setdefault(" ".join(name_tokens(faculty["displayName"])), []).append(index)
+
+    @staticmethod
+    def default_path(_term: int) -> str:
+        return f".cache/catalog-{_term}.json.gz"
+
+    def courses(self) -> List[str]:
+        return sorted(self._by_course.keys())
+
+    def get_course_sections(self, _course: str) -> List[CourseSection]:
+        assert _course in self._by_course, "no data found"
+        return self._sections(self._by_course[_course])
+
+    def get_section(self, _crn: str) -> Optional[CourseSection]:
+        index = self._by_crn.get(_crn)
+        return self._section(index) if index is not None else None
+
+    def get_instructor_sections(self, _name: str) -> List[CourseSection]:
+        return self._sections(self._by_instructor.get(" ".join(name_tokens(_name)), []))
+
+    def get_linked_sections(self, _crns: Iterable[str]) -> Optional[Dict[str, List[List[str]]]]:
+        """Return the stored link groups of the sections, or None when the snapshot was taken without them."""
+        if self._links is None:
+            return None
+        return {crn: self._links.get(crn, []) for crn in _crns}
+
+    def table(self) -> SectionTable:
+        """Compile every section of the term into a section table, in record order."""
+        return SectionTable.from_sections(self._sections(range(len(self._records))))
+
+    def open_table(self, _path: str) -> SectionTable:
+        """Map the table saved with the snapshot by `SchoolSession.snapshot`, instead of compiling it again."""
+        table = SectionTable.open(_path)
+        indexes = [self._by_crn.get(table.get_crn(row)) for row in range(len(table))]
+        assert len(table) == len(self._records) and None not in indexes, "section table does not match the snapshot"
+
+        table.sections = self._sections(indexes)
+        return table
+
+    def save(self, _path: str):
+        if directory := os.path.dirname(_path):
+            os.makedirs(directory, exist_ok=True)
+
+        with gzip.open(_path, "wt") as file:
+            json.dump(
+                {"term": self.term, "created": self.created, "links": self._links, "data": self._records},
+                file,
+                separators=(",", ":"),
+            )
+
+    @classmethod
+    def load(cls, _path: str) -> "CatalogSnapshot":
+        with gzip.open(_path, "rt") as file:
+            data = json.load(file)
+        return cls(data["term"], data["data"], links=data.get("links"), created=data["created"])
+
+    def _section(self, _index: int) -> CourseSection:
+        return self._sections([_index])[0]
+
+    def _sections(self, _indexes: Iterable[int]) -> List[CourseSection]:
+        indexes = list(_indexes)
+
+        # Records not parsed yet are validated together, which is much faster than one at a time
+        missing = [index for index in indexes if index not in self._parsed]
+        if missing:
+            self._parsed.update(zip(missing, parse_sections([self._records[index] for index in missing])))
+        return [self._parsed[index] for index in indexes]
+
+    def __len__(self) -> int:
+        return len(self._records)
@@ -1,10 +1,16 @@
-from typing import Dict, List, Set, Iterator, Callable, Optional, Union, Tuple, Literal, Any
+from typing import Dict, List, Set, Iterator, Callable, Optional, Sequence, Union, Tuple, Literal, Any
+from itertools import product
 from pydantic import BaseModel, StringConstraints, ValidationError
-from school.courses import CourseSection
+from school.courses import CourseSection, prefetch_teachers
+from school.section_filter import SectionFilter
+from school.section_table import SectionTable
 from school.session import SchoolSession
+from school.result_cache import ResultCache
+from school.schedule_metrics import MetricsAccumulator
 from school.schedule import SchedulePlot
+from util.instrument import Instrumentation
 from typing_extensions import Annotated
-from itertools import product
+import time
 
 CourseConstraint = Annotated[str, StringConstraints(pattern=r"^[A-Z]+\d+$")]
 SectionConstraint = Annotated[str, StringConstraints(pattern=r"^\d+$")]
@@ -65,12 +71,20 @@ class CourseBuilder:
     _term: int
     _courses_select: Set[CourseSelect]
     _courses_ignore: Dict[str, Set[CourseIgnore]]
+    _cache: Optional[ResultCache]
 
-    def __init__(self, _session: SchoolSession):
+    def __init__(self, _session: SchoolSession, *, cache: Optional[ResultCache] = None):
+        """
+        Args:
+            _session: Session the sections are loaded from.
+            cache: Cache of ranked schedules, which can be shared by builders to answer repeated queries
+                without searching and scoring again. Sections are still loaded, so seats stay fresh.
+        """
         self._session = _session
         self._courses_select = set()
         self._courses_ignore = {}
         self._term = -1
+        self._cache = cache
 
     def select_term(self, _term: int):
         self._term = _term
@@ -91,29 +105,156 @@ class CourseBuilder:
         max: Optional[int] = None,
         **kwargs,
     ):
-        schedules = [SchedulePlot(course, school_id=self._session.id) for course in self._get_combinations()]
-
-        if sort is not None:
-            schedules = sorted(schedules, key=sort)
+        table, ranked = self._get_ranked(sort=sort)
 
-        for index, schedule in enumerate(schedules):
+        for index, rows in enumerate(ranked):
             if max is not None and index >= max:
                 break
+            schedule = SchedulePlot(table.get_sections(rows), school_id=self._session.id, table=table, rows=rows)
             schedule.print_stats()
             schedule.plot(title=f"Semester Schedule {index + 1}", **kwargs)
 
+    def _get_ranked(
+        self, *, sort: Optional[Callable[[SchedulePlot], Any]] = None
+    ) -> Tuple[SectionTable, List[Tuple[int, ...]]]:
+        """Table of the selected sections and the rows of every schedule in ranked order, cached when possible."""
+        assert self._term > 0, "term not selected"
+
+        # Sections are loaded before the cache is checked, so that stale seats (and the seats of courses with
+        # waitlist rules, which are always checked) are refreshed and change the data version of the key. The
+        # table is only built on a miss.
+        loaded = self._load_sections()
+        key = self._cache_key(sort) if self._cache is not None else None
+
+        if key is not None:
+            if (result := self._cache.get(key)) is not None:
+                Instrumentation.count("builder.cache_hit")
+                return result
+            Instrumentation.count("builder.cache_miss")
+
+        table, candidates = self._build_table(*loaded)
+
+        if sort is None:
+            with Instrumentation.span("builder.search"):
+                combinations = list(self._search(table, candidates))
+
+            # Only the sections of some schedule are shown, so only their ratings are needed
+            self._load_ratings(table, sorted({row for rows in combinations for row in rows}))
+        else:
+            # Ratings are needed while searching, since every schedule is scored as soon as it is found
+            self._load_ratings(table, sorted({row for units in candidates for unit in units for row in unit}))
+
+            # Scores are accumulated as sections are placed, so schedules sharing a prefix share its scoring
+            accumulator = MetricsAccumulator(table)
+            with Instrumentation.span("builder.search"):
+                scored = [
+                    (rows, accumulator.metrics()) for rows in self._search(table, candidates, accumulator=accumulator)
+                ]
+
+            with Instrumentation.span("builder.sort"):
+                keys = [
+                    sort(
+                        SchedulePlot(
+                            table.get_sections(rows),
+                            school_id=self._session.id,
+                            table=table,
+                            rows=rows,
+                            metrics=metrics,
+                        )
+                    )
+                    for rows, metrics in scored
+                ]
+                combinations = [scored[index][0] for index in sorted(range(len(keys)), key=keys.__getitem__)]
+
+        # Sections that changed while searching would make the result stale as soon as it is stored
+        result = (table, combinations)
+        if key is not None and self._cache_key(sort) == key:
+            self._cache.set(key, result)
+        return result
+
+    def _load_ratings(self, _table: SectionTable, _rows: List[int]):
+        # Resolve teacher ratings concurrently so that scoring does not wait on the network
+        with Instrumentation.span("builder.ratings"):
+            prefetch_teachers(_table.get_sections(_rows), self._session.id)
+            _table.load_ratings(self._session.id, rows=_rows)
+
+    def _cache_key(self, _sort: Optional[Callable[[SchedulePlot], Any]]) -> tuple:
+        ignored_courses = (ignored for course in self._courses_ignore.values() for ignored in course)
+        version = (self._session.id, self._session.data_version(term=self._term))
+        return ResultCache.key(self._term, self._courses_select, ignored_courses, _sort, version)
+
     def _get_combinations(
         self,
         *,
         predicate: Optional[Callable[[CourseSection], bool]] = None,
     ) -> Iterator[List[CourseSection]]:
+        table, candidates = self._get_table(predicate=predicate)
+        return (table.get_sections(rows) for rows in self._search(table, candidates))
+
+    def _get_table(
+        self,
+        *,
+        predicate: Optional[Callable[[CourseSection], bool]] = None,
+    ) -> Tuple[SectionTable, List[List[Tuple[int, ...]]]]:
+        """
+        Load and filter the sections of every selected course into a table, with the candidate units of each: the
+        rows of the sections registered together, such as a lecture and its lab.
+        """
+        return self._build_table(*self._load_sections(predicate=predicate))
+
+    def _load_sections(
+        self,
+        *,
+        predicate: Optional[Callable[[CourseSection], bool]] = None,
+    ) -> Tuple[List[List[CourseSection]], List[bool]]:
+        """Load and filter the sections of every selected course, with whether each course is already registered."""
         assert self._term > 0, "term not selected"
 
         all_sections: List[List[CourseSection]] = []
+        registered: List[bool] = []
+
+        # Waitlist rules depend on seat counts, so those courses are always checked against fresh seat data
+        fresh_seats = {
+            course
+            for course, ignored_courses in self._courses_ignore.items()
+            if any(ignored_course.waitlist is not None for ignored_course in ignored_courses)
+        }
+
+        # Courses loaded with the same filter and seat freshness are fetched together
+        groups: Dict[Tuple[Optional[SectionFilter], bool], List[CourseSelect]] = {}
+        for selected_course in self._courses_select:
+            key = (self._section_filter(selected_course), selected_course.course in fresh_seats)
+            groups.setdefault(key, []).append(selected_course)
+
+        # Load every selected course at once; failures are raised with context by the loop below
+        loaded: Dict[CourseSelect, List[CourseSection]] = {}
+        with Instrumentation.span("builder.load"):
+            for (section_filter, fresh), selected_courses in groups.items():
+                results = self._session.get_course_sections_many(
+                    [selected_course.course for selected_course in selected_courses],
+                    term=self._term,
+                    max_seat_age=0 if fresh else None,
+                    section_filter=section_filter,
+                )
+                loaded.update(
+                    {
+                        selected_course: results[selected_course.course]
+                        for selected_course in selected_courses
+                        if selected_course.course in results
+                    }
+                )
 
         for selected_course in self._courses_select:
             try:
-                course_sections = self._session.get_course_sections(selected_course.course, term=self._term)
+                if selected_course in loaded:
+                    course_sections = loaded[selected_course]
+                else:
+                    course_sections = self._session.get_course_sections(
+                        selected_course.course,
+                        term=self._term,
+                        max_seat_age=0 if selected_course.course in fresh_seats else None,
+                        section_filter=self._section_filter(selected_course),
+                    )
             except ValidationError:
                 raise
             except Exception:
@@ -132,11 +273,182 @@ class CourseBuilder:
 
                 assert course_sections, f"{selected_course.course} has no available sections"
 
-            # Append list of sections for each course so that we can get the cartesian product
+            # Append list of sections for each course so that we can search over their combinations
             all_sections.append(course_sections)
+            registered.append(bool(selected_course.section))
+        return all_sections, registered
+
+    def _build_table(
+        self, _sections: List[List[CourseSection]], _registered: List[bool]
+    ) -> Tuple[SectionTable, List[List[Tuple[int, ...]]]]:
+        """Compile sections loaded by `_load_sections` into a table and link them into candidate units."""
+        with Instrumentation.span("builder.table"):
+            table = SectionTable.from_sections(section for course_sections in _sections for section in course_sections)
+        Instrumentation.count("builder.sections", len(table))
+
+        candidates = []
+        with Instrumentation.span("builder.link"):
+            for course_sections, is_registered in zip(_sections, _registered):
+                rows = table.course_rows(course_sections[0].subjectCourse)
+
+                # Registered sections are kept as they are, whatever they are linked to
+                if is_registered:
+                    candidates.append([(row,) for row in rows])
+                else:
+                    units = self._link_units(table, rows)
+
+                    assert units, f"{course_sections[0].subjectCourse} has no sections that can be registered together"
+                    candidates.append(units)
+        return table, candidates
+
+    def _link_units(self, _table: SectionTable, _rows: Sequence[int]) -> List[Tuple[int, ...]]:
+        """
+        Group the rows of a course into the units a student registers at once.
+
+        Unlinked sections are units of their own. Units of linked sections are built around the schedule type
+        with the fewest sections (usually the lecture), joined with every group of companions the school links
+        it to. When the school does not say, each is joined with one section of every other linked schedule
+        type sharing its link identifier, or with the only section of a type when there is just one. Units whose
+        sections conflict with each other or need a section that was filtered out are left out, and so are
+        linked sections in no unit, since they cannot be registered on their own.
+        """
+        units = [(row,) for row in _rows if not _table.get_section(row).isSectionLinked]
+
+        by_type: Dict[str, List[int]] = {}
+        for row in _rows:
+            section = _table.get_section(row)
+            if section.isSectionLinked:
+                by_type.setdefault(section.scheduleTypeDescription, []).append(row)
+        if not by_type:
+            return units
+
+        primary_type = min(by_type, key=lambda schedule_type: len(by_type[schedule_type]))
+        rows_by_crn = {_table.get_crn(row): row for rows in by_type.values() for row in rows}
+        linked = self._session.get_linked_sections(
+            [_table.get_crn(row) for row in by_type[primary_type]], term=self._term
+        )
+
+        for row in by_type[primary_type]:
+            crn = _table.get_crn(row)
+
+            if linked is not None:
+                groups = [
+                    tuple(rows_by_crn.get(other) for other in group if other != crn) for group in linked.get(crn, [])
+                ]
+                companions = [group for group in groups if None not in group]
+            else:
+                identifier = _table.get_section(row).linkIdentifier
+                choices = []
+                for schedule_type, rows in by_type.items():
+                    if schedule_type != primary_type:
+                        same = [
+                            other
+                            for other in rows
+                            if identifier is not None and _table.get_section(other).linkIdentifier == identifier
+                        ]
+                        # Sections with other identifiers cannot be registered together, so none are guessed
+                        choices.append(same or (rows if len(rows) == 1 else []))
+                companions = list(product(*choices))
+
+            for group in companions:
+                if _table.get_unit_mask((row, *group)) is not None:
+                    units.append((row, *group))
+
+        Instrumentation.count("builder.units", len(units))
+        return units
+
+    @staticmethod
+    def _search(
+        _table: SectionTable,
+        _candidates: Sequence[Sequence[Tuple[int, ...]]],
+        *,
+        accumulator: Optional[MetricsAccumulator] = None,
+        deadline: Optional[float] = None,
+    ) -> Iterator[Tuple[int, ...]]:
+        """
+        Enumerate the combinations of one unit per course that do not overlap, depth first, as the rows of
+        every unit one after the other.
+
+        Branches are cut as soon as a unit conflicts with the ones already chosen, and conflicts are checked
+        with a single AND of the combined masks of the units, which are built once before searching. Units
+        whose own sections conflict are skipped. Combinations come out in the same order as the cartesian
+        product.
+
+        Args:
+            _table: Table holding the candidate rows.
+            _candidates: Units each course may use, which are the rows of sections registered together.
+            accumulator: Optional accumulator the chosen rows are pushed to and popped from, which holds the
+                scores of each combination while it is yielded.
+            deadline: Optional `time.time()` timestamp after which `TimeoutError` is raised. The clock is checked
+                on the candidates tried rather than the combinations found, so that a search cutting almost
+                every branch still stops in time.
+        """
+        masks = [
+            [(unit, mask) for unit in units if (mask := _table.get_unit_mask(unit)) is not None]
+            for units in _candidates
+        ]
+        chosen: List[int] = []
+        # Candidates cut by a conflict and complete combinations found, recorded once the search ends
+        pruned = 0
+        found = 0
+        # Candidates tried since the clock was last checked
+        tried = 0
+
+        def visit(_depth: int, _occupied: int) -> Iterator[Tuple[int, ...]]:
+            nonlocal pruned, found, tried
+            if _depth == len(masks):
+                found += 1
+                yield tuple(chosen)
+                return
+
+            for unit, mask in masks[_depth]:
+                # Checking the clock on every candidate would slow the search down noticeably
+                if deadline is not None:
+                    tried += 1
+                    if tried == 1024:
+                        tried = 0
+                        if time.time() > deadline:
+                            raise TimeoutError("search did not finish before its deadline")
+
+                if not _occupied & mask:
+                    chosen.extend(unit)
+                    if accumulator is not None:
+                        for row in unit:
+                            accumulator.push(row)
+                    yield from visit(_depth + 1, _occupied | mask)
+                    if accumulator is not None:
+                        for row in reversed(unit):
+                            accumulator.pop(row)
+                    del chosen[-len(unit) :]
+                else:
+                    pruned += 1
+
+        def search() -> Iterator[Tuple[int, ...]]:
+            try:
+                yield from visit(0, 0)
+            finally:
+                Instrumentation.count("builder.pruned", pruned)
+                Instrumentation.count("builder.combinations", found)
 
-        # Get the cartesian product of all sections
-        return filter(self._section_overlap_filter, product(*all_sections))
+        return search()
+
+    def _section_filter(self, _selected_course: CourseSelect) -> Optional[SectionFilter]:
+        """
+        Filter with the rules of `_section_ignore_filter` that apply to a whole course, so that the school can
+        apply them while searching instead of returning sections that are thrown away.
+        """
+        # Registered sections are kept whatever they are
+        if _selected_course.section:
+            return None
+
+        ignored_courses = self._courses_ignore.get(_selected_course.course, set())
+        ignored_methods = {ignored_course.instructional_method for ignored_course in ignored_courses}
+
+        return SectionFilter(
+            campuses=("Main",),
+            instructional_methods=tuple(method for method in ("CLAS", "OLL") if method not in ignored_methods),
+            open_only=any(ignored_course.waitlist is True for ignored_course in ignored_courses),
+        )
 
     def _section_ignore_filter(self, _section: CourseSection) -> bool:
         # Make sure only main campus classes classes are allowed
@@ -153,36 +465,3 @@ class CourseBuilder:
 
         # All checks passed
         return True
-
-    def _section_overlap_filter(self, _sections: List[CourseSection]) -> bool:
-        # Dictionary to store occupied time slots for each day
-        occupied_times = {
-            "monday": set(),
-            "tuesday": set(),
-            "wednesday": set(),
-            "thursday": set(),
-            "friday": set(),
-            "saturday": set(),
-            "sunday": set(),
-        }
-
-        # Check each section for time conflicts
-        for section in _sections:
-            for meeting in section.meetingsFaculty:
-                mt = meeting.meetingTime
-
-                # Calculate time slot range based on start and end times
-                if mt.beginTime and mt.endTime:
-                    time_range = (mt.beginTime, mt.endTime)
-
-                    # Check and add occupied time slots for each relevant day
-                    for day in ["monday", "tuesday", "wednesday", "thursday", "friday", "saturday", "sunday"]:
-                        if getattr(mt, day):
-                            # Check for conflicts on this day
-                            if any(start < time_range[1] and end > time_range[0] for start, end in occupied_times[day]):
-                                return False  # Overlap detected
-
-                            # Add this time range to the occupied times for this day
-                            occupied_times[day].add(time_range)
-        # No overlaps found
-        return True
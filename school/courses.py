@@ -1,12 +1,56 @@
-from ratemyprofessor.database import RateMyProfessor, Teacher
+from ratemyprofessor.database import RateMyProfessor, Teacher, b64decode
+from ratemyprofessor.index import TeacherIndex, name_tokens
 from school.week_schedule import WeekSchedule, WeekTime, Day
-from typing import List, Optional, Any
-from pydantic import BaseModel, field_validator
-from datetime import time
+from util.instrument import Instrumentation
+from typing import Dict, Iterable, List, Optional, Any, Union
+from pydantic import BaseModel, Json, TypeAdapter, field_validator
+from datetime import date, datetime, time
+import os
 
 
 RateMyProfessor_API = RateMyProfessor()
 
+# Indexes of all teachers by school id, used instead of remote searches once loaded
+Teacher_Indexes: Dict[str, TeacherIndex] = {}
+
+
+def load_teacher_index(_school_id: str, *, path: Optional[str] = None, max_age=7 * 24 * 60 * 60) -> TeacherIndex:
+    """
+    Load the local index of every teacher of a school, downloading it if it is missing or older than `max_age`.
+
+    Once loaded, `CourseSection.get_teachers` matches faculty names against the index instead of searching.
+    """
+    path = path or f".cache/teachers-{b64decode(_school_id)}.json.gz"
+
+    index = TeacherIndex.load(path) if os.path.exists(path) else None
+
+    if index is None or index.age() > max_age:
+        index = TeacherIndex(RateMyProfessor_API.get_all_teachers(_school_id))
+        index.save(path)
+
+    Teacher_Indexes[_school_id] = index
+    return index
+
+
+def parse_time(_value: Optional[str]) -> Optional[time]:
+    """Parse a Banner time such as "0930" into a time object."""
+    if _value is None:
+        return _value
+    elif isinstance(_value, str) and len(_value) == 4:
+        return time(
+            hour=int(_value[:2]),
+            minute=int(_value[2:]),
+        )
+    raise ValueError("Invalid time format")
+
+
+def parse_date(_value: str) -> date:
+    """Parse a Banner date such as "01/13/2025" into a date object."""
+    try:
+        return datetime.strptime(_value, "%m/%d/%Y").date()
+    except (TypeError, ValueError):
+        raise ValueError("Invalid date format")
+
 
 class Term(BaseModel):
     code: int
@@ -41,14 +85,7 @@ class MeetingTime(BaseModel):
 
     @field_validator("beginTime", "endTime", mode="before")
     def _parse_time(cls, _value: str):
-        if _value is None:
-            return _value
-        elif isinstance(_value, str) and len(_value) == 4:
-            return time(
-                hour=int(_value[:2]),
-                minute=int(_value[2:]),
-            )
-        raise ValueError("Invalid time format")
+        return parse_time(_value)
 
 
 class Faculty(BaseModel):
@@ -161,9 +198,51 @@ class CourseSection(BaseModel):
         return class_schedule
 
     def get_teachers(self, _school_id: str) -> List[Teacher]:
+        if (index := Teacher_Indexes.get(_school_id)) is not None:
+            return [teacher for faculty in self.faculty for teacher in index.lookup(faculty.get_name())]
+
         return [
             teacher
             for faculty in self.faculty
             for teacher in RateMyProfessor_API.get_teachers(faculty.get_name().lower(), _school_id)
-            if teacher.get_name().lower() == faculty.get_name().lower()
+            if name_tokens(teacher.get_name()) == name_tokens(faculty.get_name())
         ]
+
+
+# Validating a whole list through one adapter avoids building a validator call per section
+CourseSectionList = TypeAdapter(List[CourseSection])
+
+
+def parse_sections(_records: Union[bytes, str, List[Json]]) -> List[CourseSection]:
+    """
+    Parse many section records at once.
+
+    Args:
+        _records: Raw JSON array bytes or text (validated directly without building intermediate dicts), or
+            already decoded records.
+
+    Returns:
+        List[CourseSection]: The parsed sections in order.
+    """
+    with Instrumentation.span("sections.parse"):
+        if isinstance(_records, (bytes, str)):
+            sections = CourseSectionList.validate_json(_records)
+        else:
+            sections = CourseSectionList.validate_python(_records)
+
+    Instrumentation.count("sections.parsed", len(sections))
+    return sections
+
+
+def prefetch_teachers(_sections: Iterable[CourseSection], _school_id: str, **kwargs):
+    """
+    Look up the ratings of every distinct faculty member in the sections ahead of time.
+
+    Keyword arguments are passed to `RateMyProfessor.prefetch_teachers` to tune concurrency and rate limits.
+    """
+    # Nothing to fetch when names are matched against a local index
+    if _school_id in Teacher_Indexes:
+        return
+
+    names = {faculty.get_name().lower() for section in _sections for faculty in section.faculty}
+    RateMyProfessor_API.prefetch_teachers(sorted(names), _school_id, **kwargs)
@@ -0,0 +1,82 @@
+from typing import Any, Hashable, Iterable, Optional, Tuple
+from collections import OrderedDict
+import threading
+import time
+
+
+class ResultCache:
+    """
+    In-memory cache of whole planning results, evicting the least recently used entry once it holds more than
+    `max_entries` and treating entries older than `ttl` seconds as missing.
+
+    Keys are built by `key` from everything a result depends on, including the data version of the term, so a
+    result computed before seats changed is never returned again and simply ages out.
+    """
+
+    _max_entries: int
+    _ttl: Optional[float]
+    _entries: "OrderedDict[Hashable, Tuple[float, Any]]"
+    _lock: threading.Lock
+    hits: int
+    misses: int
+
+    def __init__(self, *, max_entries: int = 1024, ttl: Optional[float] = 5 * 60):
+        assert max_entries > 0, "max entries must be greater than zero"
+        assert ttl is None or ttl > 0, "ttl must be greater than zero"
+
+        self._max_entries = max_entries
+        self._ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def key(
+        _term: int, _selected: Iterable[Hashable], _ignored: Iterable[Hashable], _sort: Hashable, _version: Hashable
+    ) -> Tuple[Hashable, ...]:
+        """
+        Build the key of a query.
+
+        Args:
+            _term: Term the query is planned for.
+            _selected: Selected courses, in any order.
+            _ignored: Ignored courses, in any order.
+            _sort: Sort key, compared by identity for functions, so a lambda created for every query never hits.
+            _version: Version of the data the result is computed from, such as `SchoolSession.data_version`.
+        """
+        return _term, frozenset(_selected), frozenset(_ignored), _sort, _version
+
+    def get(self, _key: Hashable) -> Optional[Any]:
+        with self._lock:
+            entry = self._entries.get(_key)
+
+            if entry is None or (self._ttl is not None and time.monotonic() - entry[0] > self._ttl):
+                if entry is not None:
+                    del self._entries[_key]
+                self.misses += 1
+                return None
+
+            self._entries.move_to_end(_key)
+            self.hits += 1
+            return entry[1]
+
+    def set(self, _key: Hashable, _value: Any):
+        with self._lock:
+            self._entries[_key] = (time.monotonic(), _value)
+            self._entries.move_to_end(_key)
+
+            while len(self._entries) > self._max_entries:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, *, term: Optional[int] = None):
+        """Drop every entry, or only those of one term."""
+        with self._lock:
+            if term is None:
+                self._entries.clear()
+            else:
+                for key in [key for key in self._entries if key[0] == term]:
+                    del self._entries[key]
+
+    def __len__(self) -> int:
+        return len(self._entries)
@@ -1,21 +1,57 @@
 from matplotlib.font_manager import FontProperties
 from school.week_schedule import WeekSchedule, Day
+from school.section_table import SectionTable
+from school.schedule_metrics import ScheduleMetrics
 from school.courses import CourseSection
 from util.colors import get_dark_mode_colors
 from util.display import render_table
-from typing import Dict, List, Tuple, Union
+from util.instrument import Instrumentation
+from typing import Dict, List, Optional, Sequence, Tuple, Union
 from datetime import time
 import matplotlib.pyplot as plt
 import math
 
 
 class SchedulePlot:
-    _time_slot: Dict[WeekSchedule, CourseSection]
+    _courses: List[CourseSection]
     _school_id: str
+    _table: Optional[SectionTable]
+    _rows: Optional[Sequence[int]]
+    _metrics: Optional[ScheduleMetrics]
+    _time_slot_cache: Optional[Dict[WeekSchedule, CourseSection]]
 
-    def __init__(self, _courses: List[CourseSection], *, school_id: str):
-        self._time_slot = {course.get_schedule(): course for course in _courses}
+    def __init__(
+        self,
+        _courses: List[CourseSection],
+        *,
+        school_id: str,
+        table: Optional[SectionTable] = None,
+        rows: Optional[Sequence[int]] = None,
+        metrics: Optional[ScheduleMetrics] = None,
+    ):
+        """
+        Args:
+            _courses: Sections in the schedule.
+            school_id: School used to look up teacher ratings.
+            table: Optional section table holding the sections, which lets the schedule be scored from its columns.
+            rows: Rows of the sections in `table`.
+            metrics: Optional scores accumulated while searching, which are returned instead of scoring again.
+        """
+        assert (table is None) == (rows is None), "table and rows must be given together"
+
+        self._courses = _courses
         self._school_id = school_id
+        self._table = table
+        self._rows = rows
+        self._metrics = metrics
+        self._time_slot_cache = None
+
+    @property
+    def _time_slot(self) -> Dict[WeekSchedule, CourseSection]:
+        # Weekly schedules are only built when the schedule is displayed or scored without a table
+        if self._time_slot_cache is None:
+            self._time_slot_cache = {course.get_schedule(): course for course in self._courses}
+        return self._time_slot_cache
 
     def get_range_x(self) -> Tuple[float, float]:
         """Returns the minimum and maximum times of events in the schedule."""
@@ -45,6 +81,7 @@ class SchedulePlot:
                 time_max = max(time_max, time_range.end.to_hours())
         return time_min, time_max
 
+    @Instrumentation.timed("schedule.plot")
     def plot(
         self,
         *,
@@ -183,13 +220,15 @@ class SchedulePlot:
                     lambda t1=end_time_text, t2=title_text: t2.get_window_extent().y0 - t1.get_window_extent().y1
                 )
 
-        while distances_x and (x_dist := min(distances_x, key=lambda f: f()))() < min_distance[0]:
-            while x_dist() < min_distance[0]:
-                figure.set_figwidth(figure.get_figwidth() + 0.05)
+        # Widen the figure until no labels overlap, which measures the text extents many times
+        with Instrumentation.span("schedule.layout"):
+            while distances_x and (x_dist := min(distances_x, key=lambda f: f()))() < min_distance[0]:
+                while x_dist() < min_distance[0]:
+                    figure.set_figwidth(figure.get_figwidth() + 0.05)
 
-        while distances_y and (y_dist := min(distances_y, key=lambda f: f()))() < min_distance[1]:
-            while y_dist() < min_distance[1]:
-                figure.set_figheight(figure.get_figheight() + 0.05)
+            while distances_y and (y_dist := min(distances_y, key=lambda f: f()))() < min_distance[1]:
+                while y_dist() < min_distance[1]:
+                    figure.set_figheight(figure.get_figheight() + 0.05)
 
         plt.show()
 
@@ -249,10 +288,20 @@ class ScheduleCompare:
     """Class representing a function used to compare schedules for sorting."""
 
     def week_range(_s: SchedulePlot):
+        if _s._metrics is not None:
+            return _s._metrics.week_range
+        if _s._table is not None:
+            return _s._table.week_range(_s._rows)
+
         min, max = _s.get_range_y()
         return int((max - min) * 60)
 
     def week_total(_s: SchedulePlot):
+        if _s._metrics is not None:
+            return _s._metrics.week_total
+        if _s._table is not None:
+            return _s._table.week_total(_s._rows)
+
         total_time = 0
         for schedule in _s._time_slot.keys():
             for time_range in schedule:
@@ -260,6 +309,11 @@ class ScheduleCompare:
         return total_time
 
     def between_total(_s: SchedulePlot):
+        if _s._metrics is not None:
+            return _s._metrics.between_total
+        if _s._table is not None:
+            return _s._table.between_total(_s._rows)
+
         ranges_by_day = {}
 
         for schedule in _s._time_slot.keys():
@@ -285,6 +339,13 @@ class ScheduleCompare:
         return total_time
 
     def teacher_rating(_s: SchedulePlot, *, penalty_rating=0.0, penalty_num_ratings=100.0):
+        if _s._metrics is not None:
+            return _s._metrics.teacher_rating(penalty_rating=penalty_rating, penalty_num_ratings=penalty_num_ratings)
+        if _s._table is not None:
+            return _s._table.teacher_rating(
+                _s._rows, penalty_rating=penalty_rating, penalty_num_ratings=penalty_num_ratings
+            )
+
         found_class = set()
 
         sum_rating = 0
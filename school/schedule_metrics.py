@@ -0,0 +1,152 @@
+from school.section_table import SectionTable
+from typing import Dict, List, NamedTuple, Tuple
+import bisect
+
+
+class ScheduleMetrics(NamedTuple):
+    """Scores of one schedule, equal to what the `SectionTable` scorers return for its rows."""
+
+    week_range: int
+    week_total: int
+    between_total: int
+    # Rating sums of the first section of every course, and the number of those without any rating
+    rating_sum: float
+    rating_count: float
+    unrated: int
+
+    def teacher_rating(self, *, penalty_rating=0.0, penalty_num_ratings=100.0) -> float:
+        sum_rating = self.rating_sum + self.unrated * penalty_rating * penalty_num_ratings
+        sum_num_ratings = self.rating_count + self.unrated * penalty_num_ratings
+
+        if sum_num_ratings == 0:
+            return 0
+        return sum_rating / sum_num_ratings
+
+
+class _Row(NamedTuple):
+    # Day, start and end minute of every meeting
+    meetings: Tuple[Tuple[int, int, int], ...]
+    course: int
+    rated: bool
+    rating_sum: float
+    rating_count: float
+
+
+class MetricsAccumulator:
+    """
+    Scores of a schedule kept up to date while its sections are pushed and popped, as in a depth-first search.
+
+    Every combination sharing a prefix shares the work done for that prefix, instead of each complete schedule
+    being scored from scratch. Meetings are kept sorted per day, so placing a section costs a binary search per
+    meeting, and everything else is a running sum or a stack of earlier values. Rows are read from the table the
+    first time they are pushed, so their ratings must be loaded by then.
+    """
+
+    _table: SectionTable
+    _rows: Dict[int, "_Row"]
+    _days: Dict[int, List[Tuple[int, int]]]
+    _courses: Dict[int, int]
+    # Values replaced by every push, restored by the matching pop
+    _undo: List[Tuple[int, int, int, float, float, int]]
+    _start: int
+    _end: int
+    _week_total: int
+    _between_total: int
+    _rating_sum: float
+    _rating_count: float
+    _unrated: int
+
+    def __init__(self, _table: SectionTable):
+        self._table = _table
+        self._rows = {}
+        self._days = {}
+        self._courses = {}
+        self._undo = []
+        self._start, self._end = 24 * 60, 0
+        self._week_total = 0
+        self._between_total = 0
+        self._rating_sum = 0.0
+        self._rating_count = 0.0
+        self._unrated = 0
+
+    def push(self, _row: int):
+        """Add the section of a row to the schedule."""
+        row = self._row(_row)
+        between_change = 0
+        for day, start, end in row.meetings:
+            ranges = self._days.setdefault(day, [])
+            index = bisect.bisect_left(ranges, (start, end))
+
+            # The gap between the neighbours of the new meeting is split in two
+            if index > 0:
+                between_change += start - ranges[index - 1][1]
+            if index < len(ranges):
+                between_change += ranges[index][0] - end
+            if 0 < index < len(ranges):
+                between_change -= ranges[index][0] - ranges[index - 1][1]
+
+            ranges.insert(index, (start, end))
+            self._week_total += end - start
+
+        # Only the first section of every course is rated, as in `SectionTable.teacher_rating`
+        self._courses[row.course] = self._courses.get(row.course, 0) + 1
+        first = self._courses[row.course] == 1
+
+        self._undo.append((self._start, self._end, between_change, self._rating_sum, self._rating_count, self._unrated))
+        self._between_total += between_change
+
+        for _, start, end in row.meetings:
+            self._start = min(self._start, start)
+            self._end = max(self._end, end)
+
+        if first:
+            if row.rated:
+                self._rating_sum += row.rating_sum
+                self._rating_count += row.rating_count
+            else:
+                self._unrated += 1
+
+    def pop(self, _row: int):
+        """Remove the section of a row, which must be the last one pushed."""
+        row = self._row(_row)
+        # Rating sums are restored rather than subtracted, so that rounding errors do not build up
+        self._start, self._end, between_change, self._rating_sum, self._rating_count, self._unrated = self._undo.pop()
+        self._between_total -= between_change
+
+        for day, start, end in row.meetings:
+            ranges = self._days[day]
+            del ranges[bisect.bisect_left(ranges, (start, end))]
+            self._week_total -= end - start
+
+        self._courses[row.course] -= 1
+
+    def metrics(self) -> ScheduleMetrics:
+        """Scores of the sections pushed so far."""
+        return ScheduleMetrics(
+            week_range=self._end - self._start if self._undo else 24 * 60,
+            week_total=self._week_total,
+            between_total=self._between_total,
+            rating_sum=self._rating_sum,
+            rating_count=self._rating_count,
+            unrated=self._unrated,
+        )
+
+    def _row(self, _row: int) -> "_Row":
+        # Reading single values from the columns is slow, so every row is converted once
+        if _row not in self._rows:
+            table = self._table
+            self._rows[_row] = _Row(
+                meetings=tuple(
+                    (
+                        int(table.meeting_day[meeting]),
+                        int(table.meeting_start[meeting]),
+                        int(table.meeting_end[meeting]),
+                    )
+                    for meeting in table.meetings(_row)
+                ),
+                course=int(table.course[_row]),
+                rated=bool(table.rated[_row]),
+                rating_sum=float(table.rating_sum[_row]),
+                rating_count=float(table.rating_count[_row]),
+            )
+        return self._rows[_row]
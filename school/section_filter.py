@@ -0,0 +1,38 @@
+from school.courses import CourseSection
+from pydantic import BaseModel
+from typing import Optional, Tuple
+
+
+class SectionFilter(BaseModel, frozen=True):
+    """
+    Sections to keep when loading a course.
+
+    Sessions pass whatever their school can filter on to the search itself, and every filter is applied again
+    to the returned sections, so results are the same whether or not the school supports it.
+    """
+
+    campuses: Optional[Tuple[str, ...]] = None
+    instructional_methods: Optional[Tuple[str, ...]] = None
+    open_only: bool = False
+
+    def accepts(self, _section: CourseSection) -> bool:
+        if self.campuses is not None and _section.campusDescription not in self.campuses:
+            return False
+        if self.instructional_methods is not None and _section.instructionalMethod not in self.instructional_methods:
+            return False
+        # Same comparison as the waitlist rule of `CourseIgnore`, which this filter applies early
+        if self.open_only and _section.seatsAvailable == 0:
+            return False
+        return True
+
+    def key(self) -> str:
+        """Stable text form of the filter, used to cache filtered courses apart from unfiltered ones."""
+        return ";".join(
+            [
+                f"campus={','.join(sorted(self.campuses))}" if self.campuses is not None else "",
+                f"method={','.join(sorted(self.instructional_methods))}"
+                if self.instructional_methods is not None
+                else "",
+                "open" if self.open_only else "",
+            ]
+        )
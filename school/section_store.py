@@ -0,0 +1,146 @@
+from pydantic import Json
+from typing import Dict, List, NamedTuple, Optional
+import threading
+import sqlite3
+import json
+import time
+import os
+
+
+# Fields of a section record that change constantly during registration
+SeatFields = (
+    "enrollment",
+    "seatsAvailable",
+    "waitCount",
+    "waitAvailable",
+    "maximumEnrollment",
+    "waitCapacity",
+    "openSection",
+    "crossListCount",
+    "crossListAvailable",
+)
+
+# Fields stored and refreshed with the seat counts, including the nested status derived from them
+VolatileFields = SeatFields + ("status", "reservedSeatSummary")
+
+
+def split_seats(_record: Json) -> Json:
+    """Return the volatile seat fields of a section record."""
+    return {field: _record[field] for field in VolatileFields}
+
+
+class StoredCourse(NamedTuple):
+    records: List[Json]
+    static_fetched: float
+    seats_fetched: float
+
+
+class SectionStore:
+    """
+    Persistent store of section records backed by a local SQLite file.
+
+    Static fields (meeting times, instructors, ...) and seat fields are stored separately, so that seat counts
+    can be refreshed on their own without rewriting the rest of the record. Like `RatingCache`, the database runs
+    in WAL mode with one connection per thread.
+    """
+
+    _path: str
+    _local: threading.local
+
+    def __init__(self, _path: str = ".cache/sections.sqlite"):
+        self._path = _path
+        self._local = threading.local()
+
+    @property
+    def _connection(self) -> sqlite3.Connection:
+        connection = getattr(self._local, "connection", None)
+
+        if connection is None:
+            if directory := os.path.dirname(self._path):
+                os.makedirs(directory, exist_ok=True)
+
+            connection = sqlite3.connect(self._path, timeout=30, isolation_level=None)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS courses ("
+                "term INTEGER NOT NULL, course TEXT NOT NULL, crns TEXT NOT NULL, fetched REAL NOT NULL, "
+                "PRIMARY KEY (term, course))"
+            )
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS sections ("
+                "term INTEGER NOT NULL, crn TEXT NOT NULL, static TEXT NOT NULL, seats TEXT NOT NULL, "
+                "seats_fetched REAL NOT NULL, PRIMARY KEY (term, crn))"
+            )
+            self._local.connection = connection
+        return connection
+
+    def load(self, _term: int, _course: str) -> Optional[StoredCourse]:
+        """Return the stored records of a course with the time its static and seat fields were fetched."""
+        connection = self._connection
+
+        row = connection.execute(
+            "SELECT crns, fetched FROM courses WHERE term = ? AND course = ?", (_term, _course)
+        ).fetchone()
+        if row is None:
+            return None
+
+        crns, static_fetched = json.loads(row[0]), row[1]
+        placeholders = ", ".join("?" * len(crns))
+        rows = {
+            crn: (static, seats, seats_fetched)
+            for crn, static, seats, seats_fetched in connection.execute(
+                f"SELECT crn, static, seats, seats_fetched FROM sections WHERE term = ? AND crn IN ({placeholders})",
+                (_term, *crns),
+            )
+        }
+
+        # A missing section means the store was only partially written
+        if len(rows) != len(crns):
+            return None
+
+        # Seat fields are merged last, since records stored by older versions may also hold some in the static column
+        records = [{**json.loads(rows[crn][0]), **json.loads(rows[crn][1])} for crn in crns]
+        return StoredCourse(records, static_fetched, min((entry[2] for entry in rows.values()), default=static_fetched))
+
+    def save(self, _term: int, _course: str, _records: List[Json]):
+        """Store the full records of a course."""
+        now = time.time()
+        connection = self._connection
+
+        with connection:
+            connection.execute("BEGIN")
+            connection.executemany(
+                "INSERT OR REPLACE INTO sections (term, crn, static, seats, seats_fetched) VALUES (?, ?, ?, ?, ?)",
+                [
+                    (
+                        _term,
+                        record["courseReferenceNumber"],
+                        json.dumps({k: v for k, v in record.items() if k not in VolatileFields}, separators=(",", ":")),
+                        json.dumps(split_seats(record), separators=(",", ":")),
+                        now,
+                    )
+                    for record in _records
+                ],
+            )
+            connection.execute(
+                "INSERT OR REPLACE INTO courses (term, course, crns, fetched) VALUES (?, ?, ?, ?)",
+                (_term, _course, json.dumps([record["courseReferenceNumber"] for record in _records]), now),
+            )
+
+    def update_seats(self, _term: int, _seats: Dict[str, Json]):
+        """Replace the seat fields of sections, keyed by CRN, leaving their static fields untouched."""
+        now = time.time()
+        connection = self._connection
+
+        with connection:
+            connection.execute("BEGIN")
+            connection.executemany(
+                "UPDATE sections SET seats = ?, seats_fetched = ? WHERE term = ? AND crn = ?",
+                [(json.dumps(seats, separators=(",", ":")), now, _term, crn) for crn, seats in _seats.items()],
+            )
+
+    def clear(self):
+        with self._connection as connection:
+            connection.execute("DELETE FROM courses")
+            connection.execute("DELETE FROM sections")
@@ -0,0 +1,436 @@
+from school.courses import CourseSection, parse_date
+from school.week_schedule import Day
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+import numpy as np
+import struct
+import json
+import mmap
+import os
+
+
+# Conflict masks have one bit for every minute of the week
+MaskBits = 7 * 24 * 60
+MaskWords = (MaskBits + 63) // 64
+# Width of one period in a search mask, rounded up to whole words
+PeriodBits = MaskWords * 64
+
+# Binary snapshot layout: magic, header size, JSON header, then every column aligned to a cache line
+SnapshotMagic = b"SECTABLE"
+SnapshotVersion = 2
+SnapshotAlignment = 64
+
+
+def _align(_offset: int) -> int:
+    return -(-_offset // SnapshotAlignment) * SnapshotAlignment
+
+
+class StringTable:
+    """Interns strings so that text columns can be stored as integer ids."""
+
+    strings: List[str]
+    _ids: Dict[str, int]
+
+    def __init__(self, _strings: Optional[List[str]] = None):
+        self.strings = list(_strings or [])
+        self._ids = {string: index for index, string in enumerate(self.strings)}
+
+    def intern(self, _string: str) -> int:
+        if _string not in self._ids:
+            self._ids[_string] = len(self.strings)
+            self.strings.append(_string)
+        return self._ids[_string]
+
+    def get(self, _string: str) -> Optional[int]:
+        return self._ids.get(_string)
+
+    def __getitem__(self, _id: int) -> str:
+        return self.strings[_id]
+
+
+class SectionTable:
+    """
+    Columnar copy of the section fields used by the schedule search.
+
+    Rows are grouped by course so that the sections of a course form a contiguous range, and every column is a
+    NumPy array that can be sliced without copying. Meetings are stored as ragged arrays: the meetings of row
+    `i` are `meeting_offsets[i]` to `meeting_offsets[i + 1]`, holding the merged weekly ranges that
+    `CourseSection.get_schedule` would return. The original sections are kept for display.
+
+    Conflicts depend on dates as well as weekly times, since sections of different parts of term can meet in
+    the same weekly slot. The term is split into periods at every date a timed meeting starts or stops, so a
+    meeting covers whole periods and two meetings share a period exactly when their dates overlap. The timed
+    meetings of a row are grouped by their dates into parts, which are ragged like meetings: each part has a
+    `mask` with one bit per minute of the week and covers the periods `part_start` to `part_end`. When every
+    section meets over the same dates there is one period, and conflict checks are the plain weekly ones.
+    """
+
+    strings: StringTable
+    courses: List[str]
+    course_offsets: np.ndarray
+    crn: np.ndarray
+    course: np.ndarray
+    faculty: np.ndarray
+    seats: np.ndarray
+    wait: np.ndarray
+    credits: np.ndarray
+    meeting_offsets: np.ndarray
+    meeting_day: np.ndarray
+    meeting_start: np.ndarray
+    meeting_end: np.ndarray
+    part_offsets: np.ndarray
+    part_start: np.ndarray
+    part_end: np.ndarray
+    mask: np.ndarray
+    rating_sum: np.ndarray
+    rating_count: np.ndarray
+    rated: np.ndarray
+    sections: Optional[List[CourseSection]]
+    _masks: Dict[int, int]
+    _unit_masks: Dict[Tuple[int, ...], Optional[int]]
+    _course_ids: Dict[str, int]
+
+    # Array columns, in the order they are written to a snapshot
+    Columns = (
+        "course_offsets",
+        "crn",
+        "course",
+        "faculty",
+        "seats",
+        "wait",
+        "credits",
+        "meeting_offsets",
+        "meeting_day",
+        "meeting_start",
+        "meeting_end",
+        "part_offsets",
+        "part_start",
+        "part_end",
+        "mask",
+        "rating_sum",
+        "rating_count",
+        "rated",
+    )
+
+    def __init__(self, **columns):
+        for name, value in columns.items():
+            setattr(self, name, value)
+        self._masks = {}
+        self._unit_masks = {}
+        self._course_ids = {course: index for index, course in enumerate(self.courses)}
+
+    @classmethod
+    def from_sections(cls, _sections: Iterable[CourseSection]) -> "SectionTable":
+        # Group rows by course, keeping the order in which courses and sections first appear
+        by_course: Dict[str, List[CourseSection]] = {}
+        for section in _sections:
+            by_course.setdefault(section.subjectCourse, []).append(section)
+
+        sections = [section for course_sections in by_course.values() for section in course_sections]
+        strings = StringTable()
+        count = len(sections)
+
+        course_counts = [len(course_sections) for course_sections in by_course.values()]
+        course_offsets = np.zeros(len(by_course) + 1, dtype=np.int32)
+        np.cumsum(course_counts, out=course_offsets[1:])
+
+        crn = np.empty(count, dtype=np.int32)
+        course = np.repeat(np.arange(len(by_course), dtype=np.int32), course_counts)
+        faculty = np.full(count, -1, dtype=np.int32)
+        seats = np.empty(count, dtype=np.int32)
+        wait = np.empty(count, dtype=np.int32)
+        credits = np.empty(count, dtype=np.float32)
+        meeting_offsets = np.zeros(count + 1, dtype=np.int32)
+        meetings: List[Tuple[int, int, int]] = []
+        part_offsets = np.zeros(count + 1, dtype=np.int32)
+        # First day, day after the last day and weekly bits of every part
+        parts: List[Tuple[int, int, int]] = []
+        days: Dict[Tuple[str, str], Tuple[int, int]] = {}
+
+        for row, section in enumerate(sections):
+            crn[row] = strings.intern(section.courseReferenceNumber)
+            seats[row] = section.seatsAvailable
+            wait[row] = section.waitAvailable
+            credits[row] = section.creditHours or section.creditHourLow or section.creditHourHigh or 0
+
+            primary = [member for member in section.faculty if member.primaryIndicator] or section.faculty
+            if primary:
+                faculty[row] = strings.intern(primary[0].get_name())
+
+            bits_by_days: Dict[Tuple[int, int], int] = {}
+            for meeting in section.meetingsFaculty:
+                meeting_time = meeting.meetingTime
+                if meeting_time.beginTime is None or meeting_time.endTime is None:
+                    continue
+
+                start = meeting_time.beginTime.hour * 60 + meeting_time.beginTime.minute
+                end = meeting_time.endTime.hour * 60 + meeting_time.endTime.minute
+                if end <= start:
+                    continue
+
+                bits = 0
+                for day in Day.names():
+                    if getattr(meeting_time, day):
+                        offset = Day.by_name(day).value * 24 * 60
+                        bits |= ((1 << (end - start)) - 1) << (offset + start)
+
+                dates = (meeting_time.startDate, meeting_time.endDate)
+                if dates not in days:
+                    days[dates] = cls._meeting_days(*dates)
+                bits_by_days[days[dates]] = bits_by_days.get(days[dates], 0) | bits
+
+            parts.extend((first, last, bits) for (first, last), bits in bits_by_days.items())
+            part_offsets[row + 1] = len(parts)
+
+            # Weekly ranges as they are shown and scored, which only counts in-person sections
+            for time_range in section.get_schedule():
+                meetings.append(
+                    (time_range.start.day.value, time_range.start.to_minutes(), time_range.end.to_minutes())
+                )
+            meeting_offsets[row + 1] = len(meetings)
+
+        meeting_array = np.array(meetings, dtype=np.int16).reshape(-1, 3)
+
+        periods = {
+            day: index for index, day in enumerate(sorted({day for first, last, _ in parts for day in (first, last)}))
+        }
+        part_start = np.array([periods[first] for first, _, _ in parts], dtype=np.int32)
+        part_end = np.array([periods[last] for _, last, _ in parts], dtype=np.int32)
+        mask = np.zeros((len(parts), MaskWords), dtype=np.uint64)
+        for part, (_, _, bits) in enumerate(parts):
+            mask[part] = np.frombuffer(bits.to_bytes(MaskWords * 8, "little"), dtype=np.uint64)
+
+        return cls(
+            strings=strings,
+            courses=list(by_course.keys()),
+            course_offsets=course_offsets,
+            crn=crn,
+            course=course,
+            faculty=faculty,
+            seats=seats,
+            wait=wait,
+            credits=credits,
+            meeting_offsets=meeting_offsets,
+            meeting_day=meeting_array[:, 0].astype(np.int8),
+            meeting_start=meeting_array[:, 1].copy(),
+            meeting_end=meeting_array[:, 2].copy(),
+            part_offsets=part_offsets,
+            part_start=part_start,
+            part_end=part_end,
+            mask=mask,
+            rating_sum=np.zeros(count, dtype=np.float64),
+            rating_count=np.zeros(count, dtype=np.float64),
+            rated=np.zeros(count, dtype=np.bool_),
+            sections=sections,
+        )
+
+    @staticmethod
+    def _meeting_days(_start_date: str, _end_date: str) -> Tuple[int, int]:
+        """First day and the day after the last day of a meeting, as ordinals."""
+        try:
+            return parse_date(_start_date).toordinal(), parse_date(_end_date).toordinal() + 1
+        except ValueError:
+            # Meetings without valid dates are assumed to last the whole term
+            return 0, 1 << 30
+
+    @staticmethod
+    def default_path(_term: int) -> str:
+        return f".cache/sections-{_term}.table"
+
+    def save(self, _path: str):
+        """Write the table in a binary format that `open` maps into memory without copying the columns."""
+        columns = {}
+        size = 0
+
+        for name in self.Columns:
+            array = getattr(self, name)
+            size = _align(size)
+            columns[name] = {"dtype": array.dtype.str, "shape": list(array.shape), "offset": size}
+            size += array.nbytes
+
+        header = json.dumps(
+            {
+                "version": SnapshotVersion,
+                "strings": self.strings.strings,
+                "courses": self.courses,
+                "columns": columns,
+            },
+            separators=(",", ":"),
+        ).encode()
+        data_start = _align(len(SnapshotMagic) + 8 + len(header))
+
+        if directory := os.path.dirname(_path):
+            os.makedirs(directory, exist_ok=True)
+
+        # Replace the file rather than writing over it, since other processes may have the old one mapped
+        temporary_path = f"{_path}.{os.getpid()}.tmp"
+        with open(temporary_path, "wb") as file:
+            file.write(SnapshotMagic + struct.pack("<Q", len(header)) + header)
+
+            for name in self.Columns:
+                file.seek(data_start + columns[name]["offset"])
+                file.write(np.ascontiguousarray(getattr(self, name)).tobytes())
+        os.replace(temporary_path, _path)
+
+    @classmethod
+    def open(cls, _path: str, *, sections: Optional[List[CourseSection]] = None) -> "SectionTable":
+        """
+        Map a table saved by `save` into memory.
+
+        Columns are views of the mapped file, so every process that opens the same file shares its pages and
+        nothing is parsed besides the small header. Pages are copy on write, which keeps the rating columns
+        writable for each process.
+
+        Args:
+            _path: Path of the saved table.
+            sections: Optional sections of the table in row order, needed to display schedules.
+
+        Returns:
+            SectionTable: The mapped table.
+        """
+        with open(_path, "rb") as file:
+            buffer = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_COPY)
+
+        assert buffer[: len(SnapshotMagic)] == SnapshotMagic, "file is not a section table"
+        (header_size,) = struct.unpack_from("<Q", buffer, len(SnapshotMagic))
+        header_start = len(SnapshotMagic) + 8
+        header = json.loads(buffer[header_start : header_start + header_size])
+        assert header["version"] == SnapshotVersion, f"unsupported section table version {header['version']}"
+
+        data_start = _align(header_start + header_size)
+        columns = {}
+
+        for name, column in header["columns"].items():
+            dtype = np.dtype(column["dtype"])
+            shape = tuple(column["shape"])
+            count = int(np.prod(shape))
+            offset = data_start + column["offset"] if count else 0
+            columns[name] = np.frombuffer(buffer, dtype=dtype, count=count, offset=offset).reshape(shape)
+
+        if sections is not None:
+            assert len(sections) == len(columns["crn"]), "sections do not match the table"
+
+        return cls(strings=StringTable(header["strings"]), courses=header["courses"], sections=sections, **columns)
+
+    def __len__(self) -> int:
+        return len(self.crn)
+
+    def course_rows(self, _course: str) -> range:
+        """Return the rows of a course, which can be used to slice every column without copying."""
+        assert _course in self._course_ids, f"{_course} is not in the table"
+        index = self._course_ids[_course]
+        return range(int(self.course_offsets[index]), int(self.course_offsets[index + 1]))
+
+    def get_crn(self, _row: int) -> str:
+        return self.strings[int(self.crn[_row])]
+
+    def get_section(self, _row: int) -> CourseSection:
+        assert self.sections is not None, "table was built without the full sections"
+        return self.sections[_row]
+
+    def get_sections(self, _rows: Sequence[int]) -> List[CourseSection]:
+        return [self.get_section(row) for row in _rows]
+
+    def get_mask(self, _row: int) -> int:
+        """
+        Return the conflict mask of a row as an integer, which is much faster to combine than arrays.
+
+        The weekly bits of every part are repeated for each period it covers, `PeriodBits` apart, so that two
+        rows conflict exactly when their masks share a bit.
+        """
+        if _row not in self._masks:
+            bits = 0
+            for part in range(int(self.part_offsets[_row]), int(self.part_offsets[_row + 1])):
+                weekly = int.from_bytes(self.mask[part].tobytes(), "little")
+                for period in range(int(self.part_start[part]), int(self.part_end[part])):
+                    bits |= weekly << (period * PeriodBits)
+            self._masks[_row] = bits
+        return self._masks[_row]
+
+    def get_unit_mask(self, _rows: Tuple[int, ...]) -> Optional[int]:
+        """
+        Return the combined conflict mask of sections registered together, such as a lecture and its lab, or
+        None when they conflict with each other.
+        """
+        if len(_rows) == 1:
+            return self.get_mask(_rows[0])
+
+        if _rows not in self._unit_masks:
+            bits = 0
+            for row in _rows:
+                mask = self.get_mask(row)
+                if bits & mask:
+                    bits = None
+                    break
+                bits |= mask
+            self._unit_masks[_rows] = bits
+        return self._unit_masks[_rows]
+
+    def meetings(self, _row: int) -> range:
+        return range(int(self.meeting_offsets[_row]), int(self.meeting_offsets[_row + 1]))
+
+    def load_ratings(self, _school_id: str, *, rows: Optional[Iterable[int]] = None):
+        """Fill the rating columns from the teachers of the given rows (or every row) for scoring."""
+        for row in rows if rows is not None else range(len(self)):
+            teachers = self.get_section(row).get_teachers(_school_id)
+            self.rated[row] = bool(teachers)
+            self.rating_sum[row] = sum(teacher.avgRatingRounded * teacher.numRatings for teacher in teachers)
+            self.rating_count[row] = sum(teacher.numRatings for teacher in teachers)
+
+    def week_range(self, _rows: Sequence[int]) -> int:
+        """Minutes between the earliest start and the latest end of any class in the week."""
+        if not _rows:
+            return 24 * 60
+
+        start, end = 24 * 60, 0
+        for row in _rows:
+            for meeting in self.meetings(row):
+                start = min(start, int(self.meeting_start[meeting]))
+                end = max(end, int(self.meeting_end[meeting]))
+        return end - start
+
+    def week_total(self, _rows: Sequence[int]) -> int:
+        """Total minutes spent in class during the week."""
+        return sum(
+            int(self.meeting_end[meeting]) - int(self.meeting_start[meeting])
+            for row in _rows
+            for meeting in self.meetings(row)
+        )
+
+    def between_total(self, _rows: Sequence[int]) -> int:
+        """Total minutes between consecutive classes on the same day."""
+        ranges_by_day: Dict[int, List[Tuple[int, int]]] = {}
+
+        for row in _rows:
+            for meeting in self.meetings(row):
+                ranges_by_day.setdefault(int(self.meeting_day[meeting]), []).append(
+                    (int(self.meeting_start[meeting]), int(self.meeting_end[meeting]))
+                )
+
+        total_time = 0
+        for time_ranges in ranges_by_day.values():
+            time_ranges.sort()
+            total_time += sum(time_ranges[i + 1][0] - time_ranges[i][1] for i in range(len(time_ranges) - 1))
+        return total_time
+
+    def teacher_rating(self, _rows: Sequence[int], *, penalty_rating=0.0, penalty_num_ratings=100.0) -> float:
+        """Average teacher rating weighted by number of ratings, counting the first section of each course."""
+        found_class = set()
+
+        sum_rating = 0
+        sum_num_ratings = 0
+
+        for row in _rows:
+            if (course := int(self.course[row])) not in found_class:
+                found_class.add(course)
+
+                if not self.rated[row]:
+                    # Penalty for not having a rating
+                    sum_rating += penalty_rating * penalty_num_ratings
+                    sum_num_ratings += penalty_num_ratings
+                else:
+                    sum_rating += float(self.rating_sum[row])
+                    sum_num_ratings += float(self.rating_count[row])
+
+        if sum_num_ratings == 0:
+            return 0
+        return sum_rating / sum_num_ratings
@@ -0,0 +1,364 @@
+from school.batch_planner import PlanRequest, candidate_rows, solve_in_worker
+from school.courses import Teacher_Indexes, load_teacher_index, prefetch_teachers
+from school.catalog import CatalogSnapshot
+from school.result_cache import ResultCache
+from school.section_table import SectionTable
+from school.session import SchoolSession
+from util.instrument import Instrumentation
+from concurrent.futures import ProcessPoolExecutor
+from pydantic import Json, ValidationError
+from typing import Dict, NamedTuple, Optional, Tuple
+from urllib.parse import urlsplit
+import functools
+import argparse
+import tempfile
+import asyncio
+import json
+import time
+import os
+
+# Largest request body accepted, which is far more than any selection needs
+MaxBodySize = 64 * 1024
+
+Reasons = {
+    200: "OK",
+    400: "Bad Request",
+    404: "Not Found",
+    413: "Payload Too Large",
+    500: "Internal Server Error",
+    503: "Service Unavailable",
+    504: "Gateway Timeout",
+}
+
+
+class TermState(NamedTuple):
+    """Everything kept warm for one term: its catalog and the compiled table of every section with ratings."""
+
+    snapshot: CatalogSnapshot
+    table: SectionTable
+    # Saved copy of the table that worker processes map
+    table_path: str
+
+
+class PlannerService:
+    """
+    HTTP service planning schedules, built on asyncio and the standard library alone.
+
+    `POST /plan` takes a JSON object with a `term` and the fields of a `PlanRequest` (`select` and `ignore` in
+    the `CourseSelect` and `CourseIgnore` schemas, `sort` scorer names and `max` results), plus an optional
+    `timeout` in seconds, and returns the ranked schedules with their scores. `GET /health` reports the warm
+    terms and the current load.
+
+    The catalog, compiled section table and teacher index of a term are loaded on its first request (or by
+    `warm`) and kept in memory. Searches run on a process pool that maps the saved table, so the event loop only
+    parses requests and formats results. At most `max_concurrent` searches run at once and at most
+    `max_pending` requests wait for one; anything beyond that is answered with 503 straight away, and every
+    request is answered with 504 once its deadline passes, so latency stays bounded under load. Results are
+    cached by request and data version, so a repeated request is answered without searching again.
+    """
+
+    _session: SchoolSession
+    _max_workers: int
+    _max_concurrent: int
+    _max_pending: int
+    _timeout: float
+    _max_results: int
+    _cache: ResultCache
+    _terms: Dict[int, TermState]
+    _loading: Dict[int, asyncio.Future]
+    _semaphore: Optional[asyncio.Semaphore]
+    _executor: Optional[ProcessPoolExecutor]
+    _pending: int
+    _directory: Optional[tempfile.TemporaryDirectory]
+
+    def __init__(
+        self,
+        _session: SchoolSession,
+        *,
+        max_workers: int = os.cpu_count() or 1,
+        max_concurrent: Optional[int] = None,
+        max_pending: Optional[int] = None,
+        timeout: float = 5.0,
+        max_results: int = 50,
+        cache: Optional[ResultCache] = None,
+    ):
+        """
+        Args:
+            _session: Session terms are loaded from, either from saved snapshots or by downloading them.
+            max_workers: Worker processes running searches.
+            max_concurrent: Searches running at once, the number of workers by default.
+            max_pending: Requests waiting for a search before new ones are rejected, 4 per worker by default.
+            timeout: Longest time in seconds a request may take, which requests can only lower.
+            max_results: Most schedules returned for one request.
+            cache: Cache of results, a new one by default.
+        """
+        assert max_workers > 0, "max workers must be greater than zero"
+        assert timeout > 0, "timeout must be greater than zero"
+        assert max_results > 0, "max results must be greater than zero"
+
+        self._session = _session
+        self._max_workers = max_workers
+        self._max_concurrent = max_concurrent or max_workers
+        self._max_pending = max_pending if max_pending is not None else 4 * max_workers
+        self._timeout = timeout
+        self._max_results = max_results
+        self._cache = cache if cache is not None else ResultCache()
+        self._terms = {}
+        self._loading = {}
+        self._semaphore = None
+        self._executor = None
+        self._pending = 0
+        self._directory = None
+
+    async def serve(self, *, host: str = "127.0.0.1", port: int = 8000, terms: Tuple[int, ...] = ()):
+        """Warm the given terms and serve until cancelled."""
+        server = await self.start(host=host, port=port)
+        try:
+            await self.warm(terms)
+            async with server:
+                await server.serve_forever()
+        finally:
+            self.close()
+
+    async def start(self, *, host: str = "127.0.0.1", port: int = 0) -> asyncio.AbstractServer:
+        """Start listening, on a free port unless one is given, and return the server."""
+        self._semaphore = asyncio.Semaphore(self._max_concurrent)
+        self._executor = ProcessPoolExecutor(self._max_workers)
+        # Start the workers before listening, since forked workers would otherwise inherit open connections
+        # and keep them from closing
+        self._executor.submit(int).result()
+        self._directory = tempfile.TemporaryDirectory(prefix="planner-")
+        return await asyncio.start_server(self._handle_connection, host, port)
+
+    def close(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+        if self._directory is not None:
+            self._directory.cleanup()
+            self._directory = None
+
+    async def warm(self, _terms: Tuple[int, ...]):
+        for term in _terms:
+            await self._term_state(term)
+
+    async def _term_state(self, _term: int) -> TermState:
+        if _term in self._terms:
+            return self._terms[_term]
+
+        # Requests arriving while a term loads wait for that load instead of starting their own, and the load
+        # is shielded so that it still finishes when the request that started it runs out of time
+        if _term not in self._loading:
+            loop = asyncio.get_running_loop()
+            self._loading[_term] = loop.run_in_executor(None, self._load_term, _term)
+            self._loading[_term].add_done_callback(lambda future: self._loaded(_term, future))
+        return await asyncio.shield(self._loading[_term])
+
+    def _loaded(self, _term: int, _future: asyncio.Future):
+        # Failed loads are forgotten so that the next request tries again
+        del self._loading[_term]
+        if not _future.cancelled() and _future.exception() is None:
+            self._terms[_term] = _future.result()
+
+    def _load_term(self, _term: int) -> TermState:
+        """Load the catalog of a term and compile it with ratings, downloading what is not saved locally."""
+        with Instrumentation.span("service.load_term"):
+            if os.path.exists(CatalogSnapshot.default_path(_term)):
+                snapshot = self._session.load_snapshot(term=_term)
+            else:
+                snapshot = self._session.snapshot(term=_term)
+
+            if self._session.id not in Teacher_Indexes:
+                load_teacher_index(self._session.id)
+
+            table = self._open_table(snapshot, _term)
+            prefetch_teachers(table.sections, self._session.id)
+            table.load_ratings(self._session.id)
+
+            table_path = os.path.join(self._directory.name, f"sections-{_term}.table")
+            table.save(table_path)
+            return TermState(snapshot, table, table_path)
+
+    @staticmethod
+    def _open_table(_snapshot: CatalogSnapshot, _term: int) -> SectionTable:
+        # The table saved along with the snapshot is mapped, unless it is missing or from another snapshot
+        try:
+            return _snapshot.open_table(SectionTable.default_path(_term))
+        except (AssertionError, OSError, ValueError):
+            return _snapshot.table()
+
+    async def _handle_connection(self, _reader: asyncio.StreamReader, _writer: asyncio.StreamWriter):
+        """Answer the requests of one connection in order, keeping it open between requests."""
+        try:
+            while True:
+                # Idle connections are closed so that they do not hold on to the server forever
+                request_line = await asyncio.wait_for(_reader.readline(), timeout=30)
+                if not request_line:
+                    break
+
+                method, target, version = request_line.decode("latin-1").split()
+                headers: Dict[str, str] = {}
+                while (line := await _reader.readline()) not in (b"\r\n", b"\n", b""):
+                    name, _, value = line.decode("latin-1").partition(":")
+                    headers[name.strip().lower()] = value.strip()
+
+                length = int(headers.get("content-length") or 0)
+                if length > MaxBodySize:
+                    await self._respond(_writer, 413, {"error": "request body is too large"}, keep_alive=False)
+                    break
+
+                body = await _reader.readexactly(length) if length else b""
+                status, result = await self._route(method, urlsplit(target).path, body)
+
+                keep_alive = version == "HTTP/1.1" and headers.get("connection", "").lower() != "close"
+                await self._respond(_writer, status, result, keep_alive=keep_alive)
+                if not keep_alive:
+                    break
+        except (asyncio.TimeoutError, asyncio.IncompleteReadError, ConnectionError, ValueError):
+            pass
+        finally:
+            _writer.close()
+
+    @staticmethod
+    async def _respond(_writer: asyncio.StreamWriter, _status: int, _result: Json, *, keep_alive: bool):
+        data = json.dumps(_result).encode()
+        head = (
+            f"HTTP/1.1 {_status} {Reasons.get(_status, '')}\r\n"
+            "Content-Type: application/json\r\n"
+            f"Content-Length: {len(data)}\r\n"
+            f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n"
+            "\r\n"
+        )
+        _writer.write(head.encode("latin-1") + data)
+        await _writer.drain()
+
+    async def _route(self, _method: str, _path: str, _body: bytes) -> Tuple[int, Json]:
+        if _method == "POST" and _path == "/plan":
+            return await self._plan(_body)
+        if _method == "GET" and _path == "/health":
+            return 200, {
+                "terms": sorted(self._terms),
+                "pending": self._pending,
+                "max_pending": self._max_pending,
+                "max_concurrent": self._max_concurrent,
+            }
+        return 404, {"error": f"unknown endpoint {_method} {_path}"}
+
+    async def _plan(self, _body: bytes) -> Tuple[int, Json]:
+        start = time.monotonic()
+
+        try:
+            payload = json.loads(_body)
+            assert isinstance(payload, dict), "request must be a JSON object"
+            term = int(payload.pop("term"))
+            timeout = min(float(payload.pop("timeout", self._timeout)), self._timeout)
+            request = PlanRequest.model_validate(payload)
+        except ValidationError as error:
+            return 400, {"error": "invalid request", "details": json.loads(error.json())}
+        except (AssertionError, KeyError, TypeError, ValueError) as error:
+            return 400, {"error": f"invalid request: {error}"}
+
+        max_results = min(request.max or self._max_results, self._max_results)
+        request = request.model_copy(update={"max": max_results})
+
+        if (result := self._cache.get(self._cache_key(term, request))) is not None:
+            Instrumentation.count("service.cache_hit")
+            return 200, result
+
+        # Shed load instead of queueing without limit, which would make every waiting request late
+        if self._pending >= self._max_pending:
+            Instrumentation.count("service.rejected")
+            return 503, {"error": "too many requests, try again later"}
+
+        self._pending += 1
+        try:
+            with Instrumentation.span("service.plan"):
+                remaining = timeout - (time.monotonic() - start)
+                status, result = await asyncio.wait_for(
+                    self._solve(term, request, deadline=time.time() + remaining), timeout=remaining
+                )
+            # Keyed after solving, since loading the term on its first request changes its data version
+            self._cache.set(self._cache_key(term, request), result)
+            return status, result
+        except (asyncio.TimeoutError, TimeoutError):
+            Instrumentation.count("service.timeouts")
+            return 504, {"error": f"planning took longer than {timeout:g} seconds"}
+        except AssertionError as error:
+            return 400, {"error": str(error)}
+        except Exception as error:
+            return 500, {"error": f"{type(error).__name__}: {error}"}
+        finally:
+            self._pending -= 1
+
+    def _cache_key(self, _term: int, _request: PlanRequest) -> tuple:
+        return ResultCache.key(
+            _term,
+            _request.select,
+            _request.ignore,
+            (_request.sort, _request.max),
+            self._session.data_version(term=_term),
+        )
+
+    async def _solve(self, _term: int, _request: PlanRequest, *, deadline: float) -> Tuple[int, Json]:
+        state = await self._term_state(_term)
+        loop = asyncio.get_running_loop()
+
+        # Filtering and linking sections takes long enough on large courses to hold up other requests
+        candidates = await loop.run_in_executor(
+            None, functools.partial(candidate_rows, self._session, state.table, _request, term=_term)
+        )
+
+        await self._semaphore.acquire()
+        try:
+            future = self._executor.submit(
+                solve_in_worker, state.table_path, candidates, _request.sort, _request.max, deadline=deadline
+            )
+        except BaseException:
+            # The pool is broken or shut down, so no callback would ever release the slot
+            self._semaphore.release()
+            raise
+
+        # The slot is released when the search really ends, since a running search only stops at its deadline
+        future.add_done_callback(lambda _: loop.is_closed() or loop.call_soon_threadsafe(self._semaphore.release))
+        # Searches still waiting for a worker are cancelled along with the request
+        combinations = await asyncio.wrap_future(future)
+
+        table = state.table
+        return 200, {
+            "term": _term,
+            "schedules": [
+                {
+                    "crns": [table.get_crn(row) for row in rows],
+                    "week_range": table.week_range(rows),
+                    "week_total": table.week_total(rows),
+                    "between_total": table.between_total(rows),
+                    "teacher_rating": table.teacher_rating(rows),
+                }
+                for rows in combinations
+            ],
+        }
+
+
+if __name__ == "__main__":
+    from colleges.temple_session import TUSession
+
+    parser = argparse.ArgumentParser(description="Serve schedule planning over HTTP.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--terms", type=lambda value: tuple(int(term) for term in value.split(",")), default=())
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--max-pending", type=int, help="waiting requests before new ones are rejected")
+    parser.add_argument("--timeout", type=float, default=5.0, help="longest time a request may take in seconds")
+    arguments = parser.parse_args()
+
+    # Terms without a saved snapshot are downloaded, which needs a login saved by an earlier session
+    session = TUSession()
+    session.restore_login()
+
+    service = PlannerService(
+        session, max_workers=arguments.workers, max_pending=arguments.max_pending, timeout=arguments.timeout
+    )
+    try:
+        asyncio.run(service.serve(host=arguments.host, port=arguments.port, terms=arguments.terms))
+    except KeyboardInterrupt:
+        pass
@@ -1,18 +1,67 @@
-from school.courses import CourseSection, Term
+from school.courses import CourseSection, ReservedSeatSummary, Status, Term, parse_sections
+from school.section_filter import SectionFilter
+from school.section_table import SectionTable
+from school.catalog import CatalogSnapshot
+from school.section_store import SectionStore, VolatileFields, split_seats
 from util.display import render_table
+from util.cookie_store import CookieStore
+from util.instrument import Instrumentation
+from util.json_stream import JsonStream
+from util.transport import Transport
 from abc import ABC, abstractmethod
 from pydantic import Json
-from typing import List, Union
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Deque, Dict, Iterable, Iterator, List, NamedTuple, Optional, Tuple, Union
+from collections import deque
 import requests
+import time
+
+
+class LoadedCourse(NamedTuple):
+    sections: List[CourseSection]
+    static_fetched: float
+    seats_fetched: float
 
 
 class SchoolSession(ABC):
+    _transport: Transport
     _session: requests.Session
     _authenticated: bool
+    _sections: Dict[Tuple[str, int], LoadedCourse]
+    _snapshots: Dict[int, CatalogSnapshot]
+    _store: SectionStore
+    _static_ttl: float
+    _seat_ttl: float
+    _cookie_store: Optional[CookieStore]
+    _versions: Dict[int, int]
 
-    def __init__(self):
-        self._session = requests.Session()
+    def __init__(
+        self,
+        *,
+        transport: Optional[Transport] = None,
+        store: Optional[SectionStore] = None,
+        static_ttl: float = 24 * 60 * 60,
+        seat_ttl: float = 5 * 60,
+        cookie_store: Optional[CookieStore] = None,
+    ):
+        """
+        Args:
+            transport: HTTP client used for every request.
+            store: Persistent store of fetched sections.
+            static_ttl: Seconds before meeting times, instructors and other static fields are fetched again.
+            seat_ttl: Seconds before seat counts are refreshed by default.
+            cookie_store: Encrypted store of login cookies, used by default when `cryptography` is installed.
+        """
+        self._transport = transport or Transport()
+        self._session = self._transport.session
         self._authenticated = False
+        self._sections = {}
+        self._snapshots = {}
+        self._store = store or SectionStore()
+        self._static_ttl = static_ttl
+        self._seat_ttl = seat_ttl
+        self._cookie_store = cookie_store or (CookieStore() if CookieStore.available() else None)
+        self._versions = {}
 
     @property
     @abstractmethod
@@ -24,11 +73,286 @@ class SchoolSession(ABC):
         pass
 
     @abstractmethod
-    def get_course_sections(self) -> List[CourseSection]:
+    def get_terms(self) -> List[Term]:
+        pass
+
+    def get_course_sections(
+        self,
+        _course: str,
+        *,
+        term: int,
+        max_seat_age: Optional[float] = None,
+        section_filter: Optional[SectionFilter] = None,
+    ) -> List[CourseSection]:
+        """
+        Return the sections of a course.
+
+        Sections are served from memory or the persistent store while their static fields are fresh, and only
+        the seat counts are refreshed once they are older than `max_seat_age` seconds (the session's seat TTL
+        by default). Pass `max_seat_age=0` to always check seats against the server.
+
+        Only sections accepted by `section_filter` are returned. The parts of the filter the school supports
+        are sent with the search, and filtered courses are cached separately from unfiltered ones.
+
+        Terms with a snapshot are served locally, and their seats are only checked against the server when
+        `max_seat_age` is given.
+        """
+        if term in self._snapshots:
+            if max_seat_age is None:
+                sections = self._snapshots[term].get_course_sections(_course)
+            else:
+                sections = self._load_snapshot_sections(_course, term=term, max_seat_age=max_seat_age)
+            return [section for section in sections if section_filter is None or section_filter.accepts(section)]
+
+        return self._load_course_sections(_course, term=term, max_seat_age=max_seat_age, section_filter=section_filter)
+
+    def get_course_sections_many(
+        self,
+        _courses: Iterable[str],
+        *,
+        term: int,
+        max_seat_age: Optional[float] = None,
+        section_filter: Optional[SectionFilter] = None,
+    ) -> Dict[str, List[CourseSection]]:
+        """
+        Fetch the sections of several courses, keyed by course. Courses that fail to load are left out so
+        that the error can be raised by `get_course_sections` when the course is requested on its own.
+        """
+        results: Dict[str, List[CourseSection]] = {}
+
+        for course in dict.fromkeys(_courses):
+            try:
+                results[course] = self.get_course_sections(
+                    course, term=term, max_seat_age=max_seat_age, section_filter=section_filter
+                )
+            except Exception:
+                pass
+        return results
+
+    def _load_course_sections(
+        self,
+        _course: str,
+        *,
+        term: int,
+        max_seat_age: Optional[float] = None,
+        context: Optional[str] = None,
+        section_filter: Optional[SectionFilter] = None,
+    ) -> List[CourseSection]:
+        now = time.time()
+        max_seat_age = self._seat_ttl if max_seat_age is None else max_seat_age
+        key = self._course_key(_course, section_filter)
+        loaded = self._sections.get((key, term))
+
+        # Fall back to the persistent store when the course is not loaded in memory or went stale
+        if loaded is None or now - loaded.static_fetched > self._static_ttl:
+            stored = self._store.load(term, key)
+
+            if stored is not None and now - stored.static_fetched <= self._static_ttl:
+                loaded = LoadedCourse(parse_sections(stored.records), stored.static_fetched, stored.seats_fetched)
+                Instrumentation.count("sections.store_hit")
+            else:
+                loaded = None
+        else:
+            Instrumentation.count("sections.memory_hit")
+
+        if loaded is None:
+            records = self._fetch_course_records(_course, term=term, context=context, section_filter=section_filter)
+            loaded = LoadedCourse(parse_sections(records), now, now)
+            self._store.save(term, key, records)
+            Instrumentation.count("sections.fetched")
+
+            # Replacing sections that were already handed out changes what results computed from them show
+            if (key, term) in self._sections:
+                self._changed(term)
+        elif now - loaded.seats_fetched > max_seat_age:
+            loaded = self._refresh_seats(_course, loaded, term=term, context=context, section_filter=section_filter)
+            Instrumentation.count("sections.seat_refresh")
+
+        self._sections[(key, term)] = loaded
+
+        # Schools may ignore parts of the filter, so it is always applied to the returned sections as well
+        if section_filter is None:
+            return loaded.sections
+        return [section for section in loaded.sections if section_filter.accepts(section)]
+
+    def _load_snapshot_sections(self, _course: str, *, term: int, max_seat_age: float) -> List[CourseSection]:
+        # Snapshot sections start with the seats of the time the snapshot was taken
+        loaded = self._sections.get((_course, term))
+        if loaded is None:
+            snapshot = self._snapshots[term]
+            loaded = LoadedCourse(snapshot.get_course_sections(_course), snapshot.created, snapshot.created)
+
+        if time.time() - loaded.seats_fetched > max_seat_age:
+            loaded = self._refresh_seats(_course, loaded, term=term)
+            Instrumentation.count("sections.seat_refresh")
+
+        self._sections[(_course, term)] = loaded
+        return loaded.sections
+
+    @staticmethod
+    def _course_key(_course: str, _section_filter: Optional[SectionFilter]) -> str:
+        return _course if _section_filter is None else f"{_course}?{_section_filter.key()}"
+
+    def _refresh_seats(
+        self,
+        _course: str,
+        _loaded: LoadedCourse,
+        *,
+        term: int,
+        context: Optional[str] = None,
+        section_filter: Optional[SectionFilter] = None,
+    ) -> LoadedCourse:
+        """Update only the seat fields of loaded sections, reusing their already parsed static fields."""
+        now = time.time()
+        records = self._fetch_course_records(_course, term=term, context=context, section_filter=section_filter)
+        seats = {record["courseReferenceNumber"]: split_seats(record) for record in records}
+
+        # Sections were added or removed, so the static fields have to be replaced as well
+        if seats.keys() != {section.courseReferenceNumber for section in _loaded.sections}:
+            loaded = LoadedCourse(parse_sections(records), now, now)
+            self._store.save(term, self._course_key(_course, section_filter), records)
+            self._changed(term)
+            return loaded
+
+        updates = {crn: self._parse_seats(fields) for crn, fields in seats.items()}
+        if any(
+            getattr(section, field) != updates[section.courseReferenceNumber][field]
+            for section in _loaded.sections
+            for field in VolatileFields
+        ):
+            self._changed(term)
+
+        self._store.update_seats(term, seats)
+        return LoadedCourse(
+            [section.model_copy(update=updates[section.courseReferenceNumber]) for section in _loaded.sections],
+            _loaded.static_fetched,
+            now,
+        )
+
+    @staticmethod
+    def _parse_seats(_seats: Json) -> Json:
+        # `model_copy` does not validate its updates, so the nested models are built here
+        summary = _seats["reservedSeatSummary"]
+        return {
+            **_seats,
+            "status": Status(**_seats["status"]),
+            "reservedSeatSummary": ReservedSeatSummary(**summary) if summary is not None else None,
+        }
+
+    def get_linked_sections(self, _crns: Iterable[str], *, term: int) -> Optional[Dict[str, List[List[str]]]]:
+        """
+        Return the groups of sections that each section has to be registered with, such as the labs of a
+        lecture, as course reference numbers keyed by section. Returns None when the school does not say, in
+        which case links are inferred from the schedule types of the sections.
+
+        Terms with a snapshot use the links stored with it.
+        """
+        if term in self._snapshots:
+            return self._snapshots[term].get_linked_sections(_crns)
+        return self._fetch_linked_sections(_crns, term=term)
+
+    def _fetch_linked_sections(self, _crns: Iterable[str], *, term: int) -> Optional[Dict[str, List[List[str]]]]:
+        """Ask the school which sections are linked to each section, or return None if it cannot say."""
+        return None
+
+    @abstractmethod
+    def _fetch_course_records(
+        self,
+        _course: str,
+        *,
+        term: int,
+        context: Optional[str] = None,
+        section_filter: Optional[SectionFilter] = None,
+    ) -> List[Json]:
+        """
+        Fetch the raw records of the sections of a course, optionally inside a separate search context.
+
+        Implementations may narrow the search with the parts of `section_filter` the school supports.
+        """
+        pass
+
+    def snapshot(
+        self,
+        *,
+        term: int,
+        path: Optional[str] = None,
+        table_path: Optional[str] = None,
+    ) -> CatalogSnapshot:
+        """
+        Download every section of the term, save it to a compressed file and serve course lookups from it.
+
+        The compiled section table of the term is saved next to it so that worker processes can map it with
+        `SectionTable.open` instead of parsing the catalog.
+        """
+        records = self._fetch_term_records(term=term)
+        links = self._fetch_linked_sections(
+            [record["courseReferenceNumber"] for record in records if record["isSectionLinked"]], term=term
+        )
+        snapshot = CatalogSnapshot(term, records, sections=parse_sections(records), links=links)
+        snapshot.save(path or CatalogSnapshot.default_path(term))
+        snapshot.table().save(table_path or SectionTable.default_path(term))
+        self.use_snapshot(snapshot)
+        return snapshot
+
+    def load_snapshot(self, *, term: int, path: Optional[str] = None) -> CatalogSnapshot:
+        """Load a snapshot saved by `snapshot` and serve course lookups for its term from it."""
+        snapshot = CatalogSnapshot.load(path or CatalogSnapshot.default_path(term))
+        assert snapshot.term == term, f"snapshot is for term {snapshot.term}, not {term}"
+        self.use_snapshot(snapshot)
+        return snapshot
+
+    def use_snapshot(self, _snapshot: CatalogSnapshot):
+        self._snapshots[_snapshot.term] = _snapshot
+        # Seats refreshed on top of a previous snapshot belong to its sections
+        self._sections = {key: loaded for key, loaded in self._sections.items() if key[1] != _snapshot.term}
+        self._changed(_snapshot.term)
+
+    def data_version(self, *, term: int) -> int:
+        """
+        Counter of the changes to the sections of a term seen by this session, such as new seat counts or a new
+        snapshot. Results computed from the sections stay valid for as long as it does not change.
+        """
+        return self._versions.get(term, 0)
+
+    def _changed(self, _term: int):
+        self._versions[_term] = self._versions.get(_term, 0) + 1
+
+    @abstractmethod
+    def _fetch_term_records(self, *, term: int) -> List[Json]:
+        """Fetch the raw records of every section offered in the term."""
         pass
 
+    def restore_login(self) -> bool:
+        """Reuse the cookies of a previous login if the school still accepts them, and return whether it did."""
+        if self._cookie_store is None or (cookies := self._cookie_store.load(self.id)) is None:
+            return False
+
+        self._session.cookies.update(cookies)
+        if self._probe():
+            self._authenticated = True
+            return True
+
+        # Expired cookies are dropped so that the next login starts clean
+        for name in cookies:
+            self._session.cookies.pop(name, None)
+        self._cookie_store.delete(self.id)
+        return False
+
+    def use_cookies(self, _cookies: Dict[str, str]):
+        """Authenticate with cookies from an existing login, such as one copied from a browser."""
+        self._session.cookies.update(_cookies)
+        self._authenticated = True
+
+    def _save_login(self, _cookies: Dict[str, str]):
+        """Use the cookies of a successful login and keep them for `restore_login`."""
+        self.use_cookies(_cookies)
+
+        if self._cookie_store is not None:
+            self._cookie_store.save(self.id, _cookies)
+
     @abstractmethod
-    def get_terms(self) -> List[Term]:
+    def _probe(self) -> bool:
+        """Cheaply check whether the current cookies are still logged in."""
         pass
 
     def print_terms(self, *, max: int):
@@ -38,34 +362,112 @@ class SchoolSession(ABC):
     def fetch(self, _url: str, _query_params: Json, *, json: bool = False) -> Union[Json, str]:
         assert self._authenticated, "user is not logged in"
 
-        response = self._session.get(_url, params=_query_params)
+        with Instrumentation.span("session.fetch"):
+            response = self._transport.get(_url, params=_query_params)
 
         assert response.status_code == 200, f"failed to retrieve the page: code={response.status_code}"
 
+        Instrumentation.count("session.requests")
+        Instrumentation.count("session.bytes", len(response.content))
         return response.json() if json else response.text
 
-    def fetch_all(self, _url: str, _query_params: Json) -> List[Json]:
-        _query_params["pageOffset"] = 0
-        _query_params["pageMaxSize"] = 2000
+    def fetch_stream(self, _url: str, _query_params: Json, *, key: str = "data") -> JsonStream:
+        """
+        Request a JSON object and stream the items of its `key` array as they are downloaded, without holding
+        the whole body or its decoded tree in memory.
+        """
+        assert self._authenticated, "user is not logged in"
+
+        # Only the time until the headers arrive, the body is downloaded while the stream is read
+        with Instrumentation.span("session.fetch_stream"):
+            response = self._transport.get(_url, params=_query_params, stream=True)
+
+        if response.status_code != 200:
+            response.close()
+            raise AssertionError(f"failed to retrieve the page: code={response.status_code}")
+
+        Instrumentation.count("session.requests")
+        chunks = response.iter_content(chunk_size=64 * 1024)
+        if Instrumentation.enabled:
+            chunks = self._count_bytes(chunks)
+        return JsonStream(chunks, key, on_close=response.close)
+
+    @staticmethod
+    def _count_bytes(_chunks: Iterable[bytes]) -> Iterator[bytes]:
+        for chunk in _chunks:
+            Instrumentation.count("session.bytes", len(chunk))
+            yield chunk
+
+    def fetch_all(self, _url: str, _query_params: Json, **kwargs) -> List[Json]:
+        with Instrumentation.span("session.fetch_all"):
+            return list(self.iter_all(_url, _query_params, **kwargs))
+
+    def iter_all(
+        self,
+        _url: str,
+        _query_params: Json,
+        *,
+        page_size: int = 2000,
+        max_workers: int = 4,
+    ) -> Iterator[Json]:
+        """
+        Yield every record of a paginated search in order.
+
+        The first page is read on its own to learn the total count and the page size the server uses. The
+        remaining pages are then requested concurrently, at most `max_workers` at a time. Every page is streamed
+        record by record in order, so only the records currently being decoded are held in memory.
+        """
+        assert max_workers > 0, "max workers must be greater than zero"
+
+        query_params = {**_query_params, "pageOffset": 0, "pageMaxSize": page_size}
+        first_page = self.fetch_stream(_url, query_params)
+        count = yield from self._iter_page(first_page)
+        if count == 0:
+            return
 
-        data_list: List[Json] = []
+        # The server may return smaller pages than requested, so use the size of the first page
+        offsets = iter(range(count, first_page.fields["totalCount"], count))
+        executor = ThreadPoolExecutor(max_workers=max_workers)
+        pages: Deque[Future] = deque()
 
-        while True:
-            result = self.fetch(_url, _query_params, json=True)
+        def request_next():
+            for offset in offsets:
+                pages.append(executor.submit(self.fetch_stream, _url, {**query_params, "pageOffset": offset}))
+                return
 
-            assert result["data"], "no data found"
+        try:
+            for _ in range(max_workers):
+                request_next()
 
-            # Appened all results
-            data_list.extend(result["data"])
+            while pages:
+                page = pages.popleft().result()
+                request_next()
+                yield from self._iter_page(page)
+        finally:
+            # Stop fetching pages nobody will read when the caller stops iterating early
+            executor.shutdown(wait=False, cancel_futures=True)
+            for page in pages:
+                page.add_done_callback(self._close_page)
 
-            # Update page offset by length of the data
-            _query_params["pageOffset"] += len(result["data"])
+    @staticmethod
+    def _close_page(_future: Future):
+        if not _future.cancelled() and _future.exception() is None:
+            _future.result().close()
 
-            if _query_params["pageOffset"] >= result["totalCount"]:
-                break
-        return data_list
+    @staticmethod
+    def _iter_page(_page: JsonStream) -> Iterator[Json]:
+        """Yield the records of a page and return how many there were."""
+        count = 0
+        try:
+            for record in _page:
+                count += 1
+                yield record
+        finally:
+            _page.close()
+            Instrumentation.count("session.records", count)
+        return count
 
     def send(self, _url: str, _data: Json) -> requests.Response:
         assert self._authenticated, "user is not logged in"
 
-        return self._session.post(_url, _data)
+        return self._transport.post(_url, _data)
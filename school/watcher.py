@@ -0,0 +1,182 @@
+from school.section_store import SeatFields
+from school.session import SchoolSession
+from school.courses import CourseSection
+from typing import Callable, Dict, FrozenSet, Iterable, List, Optional, TextIO
+import threading
+import json
+import time
+
+
+SeatCallback = Callable[[CourseSection], None]
+
+
+class SeatSubscription:
+    course: str
+    crns: Optional[FrozenSet[str]]
+    callback: Optional[SeatCallback]
+
+    def __init__(self, _course: str, _crns: Optional[Iterable[str]], _callback: Optional[SeatCallback]):
+        self.course = _course
+        self.crns = frozenset(_crns) if _crns is not None else None
+        self.callback = _callback
+
+    def accepts(self, _section: CourseSection) -> bool:
+        return self.crns is None or _section.courseReferenceNumber in self.crns
+
+
+class SeatWatcher:
+    """
+    Polls the seat counts of watched courses and reports the sections whose seats changed.
+
+    Subscriptions on the same course share a single request per poll. Every course is polled on its own
+    interval, which starts at `min_interval` and grows by `backoff` after each quiet poll up to `max_interval`,
+    and drops back to `min_interval` as soon as something changes.
+    """
+
+    _session: SchoolSession
+    _term: int
+    _min_interval: float
+    _max_interval: float
+    _backoff: float
+    _stream: Optional[TextIO]
+    _subscriptions: List[SeatSubscription]
+    _seats: Dict[str, Dict[str, tuple]]
+    _intervals: Dict[str, float]
+    _next_poll: Dict[str, float]
+    _stop: threading.Event
+
+    def __init__(
+        self,
+        _session: SchoolSession,
+        *,
+        term: int,
+        min_interval: float = 30,
+        max_interval: float = 15 * 60,
+        backoff: float = 2.0,
+        stream: Optional[TextIO] = None,
+    ):
+        """
+        Args:
+            _session: Logged in school session used to fetch the sections.
+            term: Term of the watched courses.
+            min_interval: Seconds between polls of a course that recently changed.
+            max_interval: Maximum seconds between polls of a quiet course.
+            backoff: Factor the interval of a course grows by after a poll without changes.
+            stream: Optional text stream that every change is written to as a JSON line.
+        """
+        assert 0 < min_interval <= max_interval, "intervals must be positive and min must not exceed max"
+        assert backoff >= 1, "backoff must be at least one"
+
+        self._session = _session
+        self._term = term
+        self._min_interval = min_interval
+        self._max_interval = max_interval
+        self._backoff = backoff
+        self._stream = stream
+        self._subscriptions = []
+        self._seats = {}
+        self._intervals = {}
+        self._next_poll = {}
+        self._stop = threading.Event()
+
+    def watch(
+        self,
+        _course: str,
+        *,
+        crns: Optional[Iterable[str]] = None,
+        callback: Optional[SeatCallback] = None,
+    ) -> SeatSubscription:
+        """Watch the sections of a course, optionally limited to some CRNs."""
+        subscription = SeatSubscription(_course, crns, callback)
+        self._subscriptions.append(subscription)
+
+        self._intervals.setdefault(_course, self._min_interval)
+        self._next_poll.setdefault(_course, 0)
+        return subscription
+
+    def unwatch(self, _subscription: SeatSubscription):
+        self._subscriptions.remove(_subscription)
+
+        if not any(subscription.course == _subscription.course for subscription in self._subscriptions):
+            for state in (self._seats, self._intervals, self._next_poll):
+                state.pop(_subscription.course, None)
+
+    def poll(self, *, force: bool = False) -> List[CourseSection]:
+        """Poll every course that is due (or every course when forced) and return the sections that changed."""
+        now = time.time()
+        due = [course for course, next_poll in self._next_poll.items() if force or next_poll <= now]
+        if not due:
+            return []
+
+        # Polls of the same course by another watcher within half an interval are shared through the session
+        loaded = self._session.get_course_sections_many(due, term=self._term, max_seat_age=self._min_interval / 2)
+        changed: List[CourseSection] = []
+
+        for course in due:
+            if course not in loaded:
+                continue
+
+            subscriptions = [subscription for subscription in self._subscriptions if subscription.course == course]
+            course_changed = [
+                section
+                for section in self._diff(course, loaded[course])
+                if any(subscription.accepts(section) for subscription in subscriptions)
+            ]
+
+            for section in course_changed:
+                self._emit(section, subscriptions)
+            changed.extend(course_changed)
+
+            interval = self._min_interval if course_changed else self._intervals[course] * self._backoff
+            self._intervals[course] = min(self._max_interval, interval)
+            self._next_poll[course] = time.time() + self._intervals[course]
+        return changed
+
+    def run(self, *, duration: Optional[float] = None):
+        """Poll until `stop` is called or `duration` seconds have passed."""
+        self._stop.clear()
+        end = time.time() + duration if duration is not None else None
+
+        while not self._stop.is_set() and (end is None or time.time() < end):
+            self.poll()
+
+            wait = min(self._next_poll.values(), default=time.time() + self._min_interval) - time.time()
+            if end is not None:
+                wait = min(wait, end - time.time())
+            self._stop.wait(max(0, wait))
+
+    def stop(self):
+        self._stop.set()
+
+    def _diff(self, _course: str, _sections: List[CourseSection]) -> List[CourseSection]:
+        """Return the sections whose seats differ from the previous poll of the course (diffed by CRN)."""
+        previous = self._seats.get(_course)
+        current = {
+            section.courseReferenceNumber: tuple(getattr(section, field) for field in SeatFields)
+            for section in _sections
+        }
+        self._seats[_course] = current
+
+        # The first poll only records the starting point
+        if previous is None:
+            return []
+        return [
+            section
+            for section in _sections
+            if previous.get(section.courseReferenceNumber) != current[section.courseReferenceNumber]
+        ]
+
+    def _emit(self, _section: CourseSection, _subscriptions: List[SeatSubscription]):
+        for subscription in _subscriptions:
+            if subscription.callback is not None and subscription.accepts(_section):
+                subscription.callback(_section)
+
+        if self._stream is not None:
+            record = {
+                "time": time.time(),
+                "course": _section.subjectCourse,
+                "crn": _section.courseReferenceNumber,
+                **{field: getattr(_section, field) for field in SeatFields},
+            }
+            self._stream.write(json.dumps(record) + "\n")
+            self._stream.flush()
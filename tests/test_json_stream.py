@@ -0,0 +1,28 @@
+from util.json_stream import JsonStream
+import pytest
+import json
+
+
+@pytest.mark.parametrize(
+    "chunks, expected",
+    [
+        ([b'{"data":[1.', b"5]}"], [1.5]),
+        ([b'{"data":[1e', b"3]}"], [1e3]),
+        ([b'{"data":[2E', b"-", b"2]}"], [2e-2]),
+        ([b'{"data":[1e+', b"2,", b"-", b"3.25]}"], [1e2, -3.25]),
+        ([b'{"data":[12', b"3]}"], [123]),
+    ],
+)
+def test_numbers_split_across_chunks(chunks, expected):
+    assert list(JsonStream(chunks, "data")) == expected
+
+
+def test_every_split_of_a_record():
+    text = json.dumps({"count": 2, "data": [{"seats": -1.25e-3, "open": True}, {"seats": 40, "name": "CIS"}]})
+    data = text.encode()
+
+    for split in range(1, len(data)):
+        stream = JsonStream([data[:split], data[split:]], "data")
+
+        assert list(stream) == json.loads(text)["data"]
+        assert stream.fields == {"count": 2}
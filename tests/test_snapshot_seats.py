@@ -0,0 +1,55 @@
+from benchmark.server import FakeServer
+from benchmark.synthetic import generate_records
+from colleges.temple_session import TUSession
+from school.catalog import CatalogSnapshot
+from school.section_store import SectionStore
+from school.watcher import SeatWatcher
+import copy
+
+
+Term = 202503
+
+
+def snapshot_session(_server: FakeServer, _records, _tmp_path) -> TUSession:
+    session = TUSession(
+        base_url=_server.banner_url, store=SectionStore(str(_tmp_path / "sections.sqlite3")), cookie_store=None
+    )
+    session.use_cookies({})
+    session.use_snapshot(CatalogSnapshot(Term, copy.deepcopy(_records)))
+    return session
+
+
+def fill_seats(_records, _course: str):
+    for record in _records:
+        if record["subjectCourse"] == _course:
+            record["enrollment"] = record["maximumEnrollment"]
+            record["seatsAvailable"] = 0
+
+
+def test_many_courses_refresh_snapshot_seats(tmp_path):
+    records = generate_records(courses=3, sections_per_course=2, term=str(Term))
+    course = records[0]["subjectCourse"]
+
+    with FakeServer(records=records).start() as server:
+        session = snapshot_session(server, records, tmp_path)
+        fill_seats(server.records, course)
+
+        stale = session.get_course_sections_many([course], term=Term)[course]
+        fresh = session.get_course_sections_many([course], term=Term, max_seat_age=0)[course]
+
+    assert any(section.seatsAvailable > 0 for section in stale)
+    assert all(section.seatsAvailable == 0 for section in fresh)
+
+
+def test_watcher_sees_seat_changes_on_snapshot_terms(tmp_path):
+    records = generate_records(courses=3, sections_per_course=2, term=str(Term))
+    course = records[0]["subjectCourse"]
+    changed = sum(record["subjectCourse"] == course and record["seatsAvailable"] > 0 for record in records)
+
+    with FakeServer(records=records).start() as server:
+        watcher = SeatWatcher(snapshot_session(server, records, tmp_path), term=Term, min_interval=1e-6)
+        watcher.watch(course)
+        assert watcher.poll(force=True) == []
+
+        fill_seats(server.records, course)
+        assert len(watcher.poll(force=True)) == changed
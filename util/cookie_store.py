@@ -0,0 +1,105 @@
+from typing import Dict, Optional
+import json
+import time
+import os
+
+try:
+    from cryptography.fernet import Fernet, InvalidToken
+except ImportError:
+    Fernet = None
+
+
+class CookieStore:
+    """
+    Encrypted file of authenticated session cookies, so that a login can be reused across restarts.
+
+    Cookies are encrypted with Fernet (from the optional `cryptography` package). The key is taken from the
+    `key` argument, then the `SCHEDULE_PLANNER_COOKIE_KEY` environment variable, and is otherwise generated
+    into a key file that only the current user can read. Entries older than `max_age` are never returned.
+    """
+
+    KeyVariable = "SCHEDULE_PLANNER_COOKIE_KEY"
+
+    _path: str
+    _key_path: str
+    _key: Optional[bytes]
+    _max_age: float
+
+    def __init__(
+        self,
+        _path: str = ".cache/cookies.bin",
+        *,
+        key: Optional[bytes] = None,
+        key_path: str = ".cache/cookies.key",
+        max_age: float = 12 * 60 * 60,
+    ):
+        """
+        Args:
+            _path: Path of the encrypted cookie file.
+            key: Fernet key used to encrypt the file.
+            key_path: Path of the generated key file, used when no key is given.
+            max_age: Seconds before stored cookies are considered expired without checking them.
+        """
+        assert Fernet is not None, "the cryptography package is required to store cookies"
+        assert max_age > 0, "max age must be greater than zero"
+
+        self._path = _path
+        self._key_path = key_path
+        self._key = key or (os.environ[self.KeyVariable].encode() if self.KeyVariable in os.environ else None)
+        self._max_age = max_age
+
+    @staticmethod
+    def available() -> bool:
+        return Fernet is not None
+
+    def load(self, _name: str) -> Optional[Dict[str, str]]:
+        """Return the cookies saved under a name, or None when there are none or they are too old."""
+        entry = self._read().get(_name)
+        if entry is None or time.time() - entry["saved"] > self._max_age:
+            return None
+        return entry["cookies"]
+
+    def save(self, _name: str, _cookies: Dict[str, str]):
+        entries = self._read()
+        entries[_name] = {"cookies": _cookies, "saved": time.time()}
+        self._write(entries)
+
+    def delete(self, _name: str):
+        entries = self._read()
+        if entries.pop(_name, None) is not None:
+            self._write(entries)
+
+    def _fernet(self) -> Fernet:
+        if self._key is None:
+            if not os.path.exists(self._key_path):
+                self._write_private(self._key_path, Fernet.generate_key())
+
+            with open(self._key_path, "rb") as file:
+                self._key = file.read().strip()
+        return Fernet(self._key)
+
+    def _read(self) -> Dict[str, dict]:
+        if not os.path.exists(self._path):
+            return {}
+
+        with open(self._path, "rb") as file:
+            token = file.read()
+
+        # A file written with another key is treated as empty and overwritten on the next save
+        try:
+            return json.loads(self._fernet().decrypt(token))
+        except InvalidToken:
+            return {}
+
+    def _write(self, _entries: Dict[str, dict]):
+        self._write_private(self._path, self._fernet().encrypt(json.dumps(_entries).encode()))
+
+    @staticmethod
+    def _write_private(_path: str, _data: bytes):
+        if directory := os.path.dirname(_path):
+            os.makedirs(directory, exist_ok=True)
+
+        # Readable by the current user only
+        descriptor = os.open(_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        with os.fdopen(descriptor, "wb") as file:
+            file.write(_data)
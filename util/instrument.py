@@ -0,0 +1,136 @@
+from util.display import render_table
+from typing import Callable, Dict, List, Optional
+from pydantic import Json
+import functools
+import threading
+import json
+import time
+import os
+
+
+class Span:
+    """Times one run of a stage and adds it to the instrument when it ends."""
+
+    _instrument: "Instrument"
+    _name: str
+    _start: float
+
+    def __init__(self, _instrument: "Instrument", _name: str):
+        self._instrument = _instrument
+        self._name = _name
+
+    def __enter__(self) -> "Span":
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, *args):
+        self._instrument.add_span(self._name, time.perf_counter() - self._start)
+
+
+class NullSpan:
+    """Span used while instrumentation is disabled, which does nothing."""
+
+    def __enter__(self) -> "NullSpan":
+        return self
+
+    def __exit__(self, *args):
+        pass
+
+
+class Instrument:
+    """
+    Stage timings and counters for finding where a planner run spends its time.
+
+    Disabled by default (set `SCHEDULE_PLANNER_INSTRUMENT=1` or call `enable`), in which case spans are a shared
+    object that does nothing and counters return immediately. Spans and counters are aggregated by name, and
+    names are prefixed with the part of the pipeline they belong to, such as `session.fetch` or `builder.search`.
+    """
+
+    enabled: bool
+    _spans: Dict[str, List[float]]
+    _counters: Dict[str, float]
+    _lock: threading.Lock
+    _null_span: NullSpan
+
+    def __init__(self, *, enabled: bool = False):
+        self.enabled = enabled
+        self._spans = {}
+        self._counters = {}
+        self._lock = threading.Lock()
+        self._null_span = NullSpan()
+
+    def enable(self):
+        self.enabled = True
+
+    def disable(self):
+        self.enabled = False
+
+    def reset(self):
+        with self._lock:
+            self._spans.clear()
+            self._counters.clear()
+
+    def span(self, _name: str):
+        """Context manager timing the stage it wraps."""
+        return Span(self, _name) if self.enabled else self._null_span
+
+    def timed(self, _name: str) -> Callable[[Callable], Callable]:
+        """Decorator timing every call of a function as a stage."""
+
+        def decorator(_function: Callable) -> Callable:
+            @functools.wraps(_function)
+            def wrapper(*args, **kwargs):
+                if not self.enabled:
+                    return _function(*args, **kwargs)
+                with Span(self, _name):
+                    return _function(*args, **kwargs)
+
+            return wrapper
+
+        return decorator
+
+    def count(self, _name: str, _value: float = 1):
+        if not self.enabled:
+            return
+        with self._lock:
+            self._counters[_name] = self._counters.get(_name, 0) + _value
+
+    def add_span(self, _name: str, _seconds: float):
+        with self._lock:
+            # Count, total and maximum seconds
+            span = self._spans.setdefault(_name, [0, 0.0, 0.0])
+            span[0] += 1
+            span[1] += _seconds
+            span[2] = max(span[2], _seconds)
+
+    def summary(self) -> Json:
+        with self._lock:
+            return {
+                "spans": {
+                    name: {"count": count, "total": total, "mean": total / count, "max": maximum}
+                    for name, (count, total, maximum) in sorted(self._spans.items())
+                },
+                "counters": dict(sorted(self._counters.items())),
+            }
+
+    def to_json(self, _path: Optional[str] = None) -> str:
+        """Return the summary as JSON, also writing it to a file when a path is given."""
+        data = json.dumps(self.summary(), indent=4)
+        if _path is not None:
+            with open(_path, "w") as file:
+                file.write(data + "\n")
+        return data
+
+    def print_summary(self):
+        summary = self.summary()
+        render_table(
+            ["Stage", "Calls", "Total", "Mean", "Max"],
+            [
+                (name, span["count"], f"{span['total']:.3f} s", f"{span['mean'] * 1000:.2f} ms", f"{span['max']:.3f} s")
+                for name, span in summary["spans"].items()
+            ],
+        )
+        render_table(["Counter", "Value"], [(name, f"{value:g}") for name, value in summary["counters"].items()])
+
+
+Instrumentation = Instrument(enabled=os.environ.get("SCHEDULE_PLANNER_INSTRUMENT") == "1")
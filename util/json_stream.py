@@ -0,0 +1,145 @@
+from typing import Callable, Dict, Iterable, Iterator, Optional, Union
+from pydantic import Json
+import codecs
+import json
+import re
+
+
+Whitespace = re.compile(r"[ \t\n\r]*")
+
+# Characters a number can end with in the middle of being sent, such as the "." of "1.5"
+NumberTail = re.compile(r"[.eE+-]*")
+
+
+class JsonStream:
+    """
+    Incrementally decode one array field of a JSON object, yielding its items as they arrive.
+
+    Only the current chunk and the item being decoded are held in memory, instead of the whole body and its
+    decoded tree. The other fields of the object are collected into `fields` as they are passed, so fields that
+    come before the array are available as soon as iteration starts and the rest once it has finished.
+    """
+
+    fields: Dict[str, Json]
+    _chunks: Iterator[Union[bytes, str]]
+    _key: str
+    _on_close: Optional[Callable[[], None]]
+    _decoder: json.JSONDecoder
+    _text_decoder: codecs.IncrementalDecoder
+    _buffer: str
+    _position: int
+    _finished: bool
+
+    def __init__(
+        self,
+        _chunks: Iterable[Union[bytes, str]],
+        _key: str,
+        *,
+        on_close: Optional[Callable[[], None]] = None,
+    ):
+        """
+        Args:
+            _chunks: Pieces of the JSON text, as UTF-8 bytes or text.
+            _key: Name of the top level field holding the array to stream.
+            on_close: Called once when the stream is closed or fully read, e.g. to release the connection.
+        """
+        self.fields = {}
+        self._chunks = iter(_chunks)
+        self._key = _key
+        self._on_close = on_close
+        self._decoder = json.JSONDecoder()
+        self._text_decoder = codecs.getincrementaldecoder("utf-8")()
+        self._buffer = ""
+        self._position = 0
+        self._finished = False
+
+    def __iter__(self) -> Iterator[Json]:
+        try:
+            self._expect("{")
+
+            while not self._accept("}"):
+                key = self._value()
+                self._expect(":")
+
+                if key == self._key:
+                    yield from self._array()
+                else:
+                    self.fields[key] = self._value()
+
+                if not self._accept(","):
+                    self._expect("}")
+                    break
+        finally:
+            self.close()
+
+    def close(self):
+        if self._on_close is not None:
+            self._on_close()
+            self._on_close = None
+
+    def _array(self) -> Iterator[Json]:
+        self._expect("[")
+        if self._accept("]"):
+            return
+
+        while True:
+            yield self._value()
+
+            if not self._accept(","):
+                self._expect("]")
+                return
+
+    def _value(self) -> Json:
+        self._skip_whitespace()
+
+        while True:
+            try:
+                value, end = self._decoder.raw_decode(self._buffer, self._position)
+            except json.JSONDecodeError:
+                # The value may continue in the next chunk
+                if not self._read():
+                    raise
+                continue
+
+            # A number or literal at the very end of the buffer may still be cut short, including a number
+            # decoded without its fraction or exponent because the chunk ended right after the "." or "e"
+            if NumberTail.fullmatch(self._buffer, end) and self._read():
+                continue
+
+            self._position = end
+            return value
+
+    def _accept(self, _character: str) -> bool:
+        self._skip_whitespace()
+        if self._position < len(self._buffer) and self._buffer[self._position] == _character:
+            self._position += 1
+            return True
+        return False
+
+    def _expect(self, _character: str):
+        if not self._accept(_character):
+            found = self._buffer[self._position : self._position + 1] or "end of data"
+            raise json.JSONDecodeError(f"Expecting '{_character}', found {found!r}", self._buffer, self._position)
+
+    def _skip_whitespace(self):
+        while True:
+            self._position = Whitespace.match(self._buffer, self._position).end()
+            if self._position < len(self._buffer) or not self._read():
+                return
+
+    def _read(self) -> bool:
+        """Append the next chunk to the buffer, dropping the part already decoded. Returns False at the end."""
+        if self._finished:
+            return False
+
+        for chunk in self._chunks:
+            text = self._text_decoder.decode(chunk) if isinstance(chunk, bytes) else chunk
+            if text:
+                self._buffer = self._buffer[self._position :] + text
+                self._position = 0
+                return True
+
+        self._finished = True
+        self._buffer = self._buffer[self._position :] + self._text_decoder.decode(b"", final=True)
+        self._position = 0
+        return False
@@ -0,0 +1,45 @@
+from typing import Optional
+import threading
+import time
+
+
+class RateLimiter:
+    """Thread safe token bucket that allows `rate` acquisitions per second with bursts of up to `burst`."""
+
+    _rate: float
+    _burst: float
+    _tokens: float
+    _updated: float
+    _lock: threading.Lock
+
+    def __init__(self, _rate: float, *, burst: Optional[float] = None):
+        assert _rate > 0, "rate must be greater than zero"
+        assert burst is None or burst >= 1, "burst must be at least one"
+
+        self._rate = _rate
+        self._burst = burst if burst is not None else max(1.0, _rate)
+        self._tokens = self._burst
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        """Block until a token is available and consume it."""
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self._burst, self._tokens + (now - self._updated) * self._rate)
+                self._updated = now
+
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+
+                wait = (1 - self._tokens) / self._rate
+            time.sleep(wait)
+
+    def __enter__(self) -> "RateLimiter":
+        self.acquire()
+        return self
+
+    def __exit__(self, *_):
+        pass
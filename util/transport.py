@@ -0,0 +1,156 @@
+from requests.adapters import HTTPAdapter
+from typing import Deque, Dict, NamedTuple, Optional, Tuple, Union
+from urllib.parse import urlsplit
+from email.utils import parsedate_to_datetime
+from collections import deque
+import threading
+import requests
+import random
+import time
+
+
+class RequestMetric(NamedTuple):
+    method: str
+    host: str
+    path: str
+    status: Optional[int]
+    attempt: int
+    elapsed: float
+    bytes: int
+
+
+class Transport:
+    """
+    Pooled HTTP client shared by the school sessions and RateMyProfessor.
+
+    Requests go through bounded connection pools with a limit on concurrent requests per host, negotiate
+    gzip, and are retried with exponential backoff and full jitter on connection errors, 429 and 5xx
+    responses. Every attempt is recorded in `metrics`.
+    """
+
+    # Status codes that are worth retrying (rate limits and server side errors)
+    RetryStatus = frozenset({429, 500, 502, 503, 504})
+
+    session: requests.Session
+    metrics: Deque[RequestMetric]
+    _retries: int
+    _backoff: float
+    _max_backoff: float
+    _timeout: Union[float, Tuple[float, float]]
+    _max_per_host: int
+    _host_limits: Dict[str, threading.BoundedSemaphore]
+    _lock: threading.Lock
+
+    def __init__(
+        self,
+        *,
+        pool_connections: int = 4,
+        pool_maxsize: int = 16,
+        max_per_host: int = 8,
+        retries: int = 4,
+        backoff: float = 0.5,
+        max_backoff: float = 30.0,
+        timeout: Union[float, Tuple[float, float]] = (10, 120),
+        max_metrics: int = 10_000,
+    ):
+        assert max_per_host > 0, "maximum requests per host must be greater than zero"
+        assert retries >= 0, "retries must not be negative"
+
+        self.session = requests.Session()
+        self.session.headers.update({"Accept-Encoding": "gzip, deflate"})
+
+        # Block instead of opening extra connections when the pool is exhausted
+        adapter = HTTPAdapter(pool_connections=pool_connections, pool_maxsize=pool_maxsize, pool_block=True)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+        self.metrics = deque(maxlen=max_metrics)
+        self._retries = retries
+        self._backoff = backoff
+        self._max_backoff = max_backoff
+        self._timeout = timeout
+        self._max_per_host = max_per_host
+        self._host_limits = {}
+        self._lock = threading.Lock()
+
+    def get(self, _url: str, **kwargs) -> requests.Response:
+        return self.request("GET", _url, **kwargs)
+
+    def post(self, _url: str, _data=None, **kwargs) -> requests.Response:
+        return self.request("POST", _url, data=_data, **kwargs)
+
+    def request(self, _method: str, _url: str, **kwargs) -> requests.Response:
+        """Send a request, retrying throttled and failed attempts with exponential backoff."""
+        kwargs.setdefault("timeout", self._timeout)
+        url = urlsplit(_url)
+        limit = self._host_limit(url.netloc)
+
+        for attempt in range(self._retries + 1):
+            start = time.perf_counter()
+            retry_after = None
+
+            try:
+                with limit:
+                    response = self.session.request(_method, _url, **kwargs)
+            except (requests.ConnectionError, requests.Timeout):
+                self._record(_method, url.netloc, url.path, None, attempt, start, 0)
+                if attempt == self._retries:
+                    raise
+            else:
+                size = 0 if kwargs.get("stream") else len(response.content)
+                self._record(_method, url.netloc, url.path, response.status_code, attempt, start, size)
+
+                if response.status_code not in self.RetryStatus or attempt == self._retries:
+                    return response
+                retry_after = self._retry_after(response)
+                # The connection only goes back to the pool once the discarded response is closed
+                response.close()
+
+            time.sleep(retry_after if retry_after is not None else self._delay(attempt))
+
+    def summary(self) -> Dict[str, Dict[str, float]]:
+        """Aggregate the recorded metrics by host."""
+        hosts: Dict[str, Dict[str, float]] = {}
+
+        for metric in list(self.metrics):
+            host = hosts.setdefault(
+                metric.host, {"requests": 0, "retries": 0, "errors": 0, "seconds": 0.0, "max_seconds": 0.0, "bytes": 0}
+            )
+            host["requests"] += 1
+            host["retries"] += metric.attempt > 0
+            host["errors"] += metric.status is None or metric.status >= 400
+            host["seconds"] += metric.elapsed
+            host["max_seconds"] = max(host["max_seconds"], metric.elapsed)
+            host["bytes"] += metric.bytes
+        return hosts
+
+    def _host_limit(self, _host: str) -> threading.BoundedSemaphore:
+        with self._lock:
+            if _host not in self._host_limits:
+                self._host_limits[_host] = threading.BoundedSemaphore(self._max_per_host)
+            return self._host_limits[_host]
+
+    def _delay(self, _attempt: int) -> float:
+        # Full jitter keeps concurrent clients from retrying in lockstep
+        return random.uniform(0, min(self._max_backoff, self._backoff * 2**_attempt))
+
+    def _retry_after(self, _response: requests.Response) -> Optional[float]:
+        value = _response.headers.get("Retry-After")
+        if value is None:
+            return None
+
+        try:
+            delay = float(value)
+        except ValueError:
+            try:
+                delay = parsedate_to_datetime(value).timestamp() - time.time()
+            except (TypeError, ValueError):
+                return None
+        return min(self._max_backoff, max(0.0, delay))
+
+    def _record(
+        self, _method: str, _host: str, _path: str, _status: Optional[int], _attempt: int, _start: float, _bytes: int
+    ):
+        self.metrics.append(
+            RequestMetric(_method, _host, _path, _status, _attempt, time.perf_counter() - _start, _bytes)
+        )